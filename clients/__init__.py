@@ -1,10 +1,24 @@
 """
 Módulo de clientes para comunicación MQTT, WebSocket y Backend
 """
+import importlib
 
-from .mqtt_client import MQTTClient
-from .backend_client import BackendClient
-from .websocket_server import WebSocketServer
-from .whatsapp_client import WhatsAppClient
+# Importación diferida: cada servicio solo carga los clientes que usa
+# (p.ej. el servicio MQTT no necesita websockets ni los handlers de WhatsApp)
+_LAZY_EXPORTS = {
+    'MQTTClient': '.mqtt_client',
+    'BackendClient': '.backend_client',
+    'WebSocketServer': '.websocket_server',
+    'WhatsAppClient': '.whatsapp_client',
+}
 
 __all__ = ['MQTTClient', 'BackendClient', 'WebSocketServer', 'WhatsAppClient']
+
+
+def __getattr__(name):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
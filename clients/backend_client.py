@@ -14,6 +14,10 @@ from config.settings import BackendConfig
 class BackendClient:
     """Cliente para comunicación con el backend"""
 
+    # Pool keep-alive hacia el backend (un solo host, compartido por workers y handlers)
+    POOL_CONNECTIONS = 4
+    POOL_MAXSIZE = 32
+
     def __init__(self, config: BackendConfig):
 
         self.config = config
@@ -28,7 +32,11 @@ class BackendClient:
             status_forcelist=[429, 500, 502, 503, 504],
         )
         
-        adapter = HTTPAdapter(max_retries=retry_strategy)
+        adapter = HTTPAdapter(
+            pool_connections=self.POOL_CONNECTIONS,
+            pool_maxsize=self.POOL_MAXSIZE,
+            max_retries=retry_strategy
+        )
         self.session.mount("http://", adapter)
         self.session.mount("https://", adapter)
         
@@ -4,9 +4,10 @@ Cliente MQTT escalable y reutilizable
 import json
 import logging
 import time
-from typing import Callable, Optional, Any, Dict
+from typing import Callable, Optional, Any, Dict, Iterable, Tuple
 import paho.mqtt.client as mqtt
 from config.settings import MQTTConfig
+from utils.serialization import dumps_payload, json_text
 
 
 class MQTTClient:
@@ -43,7 +44,7 @@ class MQTTClient:
             if self.config.tls:
                 import ssl
                 self.client.tls_set(cert_reqs=ssl.CERT_REQUIRED)
-                self.logger.info(f"🔒 MQTT sobre WSS (TLS habilitado) — path: {self.config.ws_path}")
+                self.logger.info("🔒 MQTT sobre WSS (TLS habilitado) — path: %s", self.config.ws_path)
     
     def _should_display_message(self, topic: str) -> bool:
         """Determinar si un mensaje debe mostrarse (solo BOTONERA válidos)"""
@@ -81,7 +82,7 @@ class MQTTClient:
             
             # Solo mostrar log la primera vez o cada 10 reconexiones
             if self.first_connection or self.connection_count % 10 == 0:
-                self.logger.info(f"✅ Conectado al broker MQTT (conexión #{self.connection_count})")
+                self.logger.info("✅ Conectado al broker MQTT (conexión #%s)", self.connection_count)
                 self.first_connection = False
             
             # Ejecutar callback personalizado si existe
@@ -89,7 +90,7 @@ class MQTTClient:
                 self.on_connect_callback(client, userdata, flags, rc)
         else:
             self.is_connected = False
-            self.logger.error(f"Fallo al conectar, código de retorno {rc}")
+            self.logger.error("Fallo al conectar, código de retorno %s", rc)
     
     def _on_message(self, client, userdata, msg):
         """Callback interno para mensajes recibidos - SOLO muestra BOTONERA válidos"""
@@ -115,7 +116,7 @@ class MQTTClient:
                     self.logger.info("📊 QoS: %s", msg.qos)
                     self.logger.info("🔄 Retain: %s", msg.retain)
                     if json_data is not None:
-                        self.logger.info("✅ JSON VÁLIDO: %s", json.dumps(json_data, indent=2))
+                        self.logger.info("✅ JSON VÁLIDO: %s", json_text(json_data, indent=True))
                     else:
                         self.logger.info("⚠️ NO ES JSON VÁLIDO")
                     self.logger.info("=" * 100)
@@ -131,14 +132,14 @@ class MQTTClient:
                 self.on_message_callback(topic, payload, json_data)
                 
         except Exception as e:
-            self.logger.error(f"💥 ERROR PROCESANDO MENSAJE: {e}")
+            self.logger.error("💥 ERROR PROCESANDO MENSAJE: %s", e)
     
     def _on_disconnect(self, client, userdata, rc):
         """Callback interno para desconexión"""
         self.is_connected = False
         # Solo mostrar log de desconexión si es un error (rc != 0)
         if rc != 0:
-            self.logger.warning(f"Desconexión inesperada del broker MQTT: {rc}, reintentando...")
+            self.logger.warning("Desconexión inesperada del broker MQTT: %s, reintentando...", rc)
         
         if self.on_disconnect_callback:
             self.on_disconnect_callback(client, userdata, rc)
@@ -153,7 +154,7 @@ class MQTTClient:
             )
             return True
         except Exception as e:
-            self.logger.error(f"Error conectando al broker: {e}")
+            self.logger.error("Error conectando al broker: %s", e)
             return False
     
     def start_loop(self):
@@ -178,35 +179,73 @@ class MQTTClient:
         try:
             result = self.client.publish(topic, message, qos)
             if result.rc == mqtt.MQTT_ERR_SUCCESS:
-                self.logger.info(f"Mensaje publicado en {topic}: {message}")
+                self.logger.info("Mensaje publicado en %s: %s", topic, message)
                 return True
             else:
-                self.logger.error(f"Error publicando mensaje: {result.rc}")
+                self.logger.error("Error publicando mensaje: %s", result.rc)
                 return False
         except Exception as e:
-            self.logger.error(f"Excepción al publicar: {e}")
+            self.logger.error("Excepción al publicar: %s", e)
             return False
     
     def publish_json(self, topic: str, data: Dict[str, Any], qos: int = 0) -> bool:
         """Publicar datos JSON en un tema"""
         try:
-            json_message = json.dumps(data)
+            json_message = dumps_payload(data)
             return self.publish(topic, json_message, qos)
         except Exception as e:
-            self.logger.error(f"Error serializando JSON: {e}")
+            self.logger.error("Error serializando JSON: %s", e)
             return False
     
+    def publish_batch(self, messages: Iterable[Tuple[str, Dict[str, Any]]], qos: int = 0) -> int:
+        """
+        Publicar varios JSON seguidos en la cola de salida de paho.
+        El hilo de red los escribe juntos; se registra un solo log para todo el lote.
+        Los datos compartidos entre topics (mismo objeto) se serializan una sola vez.
+        Retorna la cantidad de mensajes encolados correctamente.
+        """
+        if not self.is_connected:
+            self.logger.warning("No conectado al broker. No se puede publicar.")
+            return 0
+        
+        queued = 0
+        failed_topics = []
+        # Mismo objeto de datos en varios topics -> se serializa una sola vez.
+        # El cache guarda también el objeto: mientras siga referenciado su id no
+        # puede reutilizarse, aunque los mensajes vengan de un generador.
+        payloads: Dict[int, Tuple[Any, str]] = {}
+        for topic, data in messages:
+            try:
+                cached = payloads.get(id(data))
+                if cached is None:
+                    cached = payloads[id(data)] = (data, dumps_payload(data))
+                payload = cached[1]
+                result = self.client.publish(topic, payload, qos)
+            except Exception as e:
+                self.logger.error("Excepción al publicar en %s: %s", topic, e)
+                failed_topics.append(topic)
+                continue
+            if result.rc == mqtt.MQTT_ERR_SUCCESS:
+                queued += 1
+            else:
+                failed_topics.append(topic)
+        
+        if failed_topics:
+            self.logger.error("Error publicando lote en: %s", ", ".join(failed_topics))
+        self.logger.debug("Lote publicado: %s/%s mensajes", queued, queued + len(failed_topics))
+        return queued
+    
     def subscribe(self, topic: str, qos: int = 0):
         """Suscribirse a un tema adicional"""
         if self.is_connected:
             self.client.subscribe(topic, qos)
-            self.logger.info(f"Suscrito a {topic}")
+            self.logger.info("Suscrito a %s", topic)
     
     def unsubscribe(self, topic: str):
         """Desuscribirse de un tema"""
         if self.is_connected:
             self.client.unsubscribe(topic)
-            self.logger.info(f"Desuscrito de {topic}")
+            self.logger.info("Desuscrito de %s", topic)
     
     def set_message_callback(self, callback: Callable):
         """Establecer callback para mensajes recibidos"""
@@ -3,7 +3,8 @@ Mini cliente MQTT para publicación que reutiliza el MQTTClient existente
 """
 
 import logging
-from typing import Dict, Any, Optional
+import threading
+from typing import Dict, Any, Optional, Iterable, Tuple
 from clients.mqtt_client import MQTTClient
 from config.settings import MQTTConfig
 
@@ -24,6 +25,8 @@ class MQTTPublisherLite:
         self._setup_publisher_callbacks()
         
         self.is_connected = False
+        # Se activa cuando el broker responde al CONNECT (con éxito o error)
+        self._connack_event = threading.Event()
         self.publish_count = 0
         self.error_count = 0
     
@@ -37,7 +40,8 @@ class MQTTPublisherLite:
                 self.logger.info("📤 MQTT Publisher conectado al broker")
             else:
                 self.is_connected = False
-                self.logger.error(f"❌ Error conectando MQTT Publisher: {rc}")
+                self.logger.error("❌ Error conectando MQTT Publisher: %s", rc)
+            self._connack_event.set()
         
         def minimal_disconnect_callback(client, userdata, rc):
             """Callback de desconexión"""
@@ -57,28 +61,27 @@ class MQTTPublisherLite:
         Reutiliza el método connect del MQTTClient existente
         """
         try:
+            self._connack_event.clear()
             if self.mqtt_client.connect():
                 self.mqtt_client.start_loop()
                 
-                # Esperar un poco para que se establezca la conexión
-                import time
-                timeout = 5
-                start_time = time.time()
-                while not self.is_connected and (time.time() - start_time) < timeout:
-                    time.sleep(0.1)
+                # Esperar la respuesta del broker (máx. 5s) sin sondear el estado
+                answered = self._connack_event.wait(timeout=5)
                 
                 if self.is_connected:
                     self.logger.info("✅ MQTT Publisher conectado y listo")
                     return True
                 else:
-                    self.logger.error("❌ Timeout conectando MQTT Publisher")
+                    # Si el broker respondió con error, el callback ya lo registró
+                    if not answered:
+                        self.logger.error("❌ Timeout conectando MQTT Publisher")
                     return False
             else:
                 self.logger.error("❌ Error en conexión inicial")
                 return False
                 
         except Exception as e:
-            self.logger.error(f"❌ Error conectando al broker: {e}")
+            self.logger.error("❌ Error conectando al broker: %s", e)
             return False
     
     def disconnect(self):
@@ -92,7 +95,7 @@ class MQTTPublisherLite:
             self.is_connected = False
             self.logger.info("✅ MQTT Publisher desconectado")
         except Exception as e:
-            self.logger.error(f"❌ Error desconectando: {e}")
+            self.logger.error("❌ Error desconectando: %s", e)
     
     def publish(self, topic: str, message: str, qos: int = 0) -> bool:
         """
@@ -108,16 +111,16 @@ class MQTTPublisherLite:
             success = self.mqtt_client.publish(topic, message, qos)
             if success:
                 self.publish_count += 1
-                self.logger.info(f"📤 Mensaje publicado en {topic}")
+                self.logger.debug("📤 Mensaje publicado en %s", topic)
             else:
                 self.error_count += 1
-                self.logger.error(f"❌ Error publicando mensaje en {topic}")
+                self.logger.error("❌ Error publicando mensaje en %s", topic)
             
             return success
             
         except Exception as e:
             self.error_count += 1
-            self.logger.error(f"❌ Excepción publicando mensaje: {e}")
+            self.logger.error("❌ Excepción publicando mensaje: %s", e)
             return False
     
     def publish_json(self, topic: str, data: Dict[str, Any], qos: int = 0) -> bool:
@@ -134,18 +137,41 @@ class MQTTPublisherLite:
             success = self.mqtt_client.publish_json(topic, data, qos)
             if success:
                 self.publish_count += 1
-                self.logger.info(f"📤 JSON publicado en {topic}")
+                self.logger.debug("📤 JSON publicado en %s", topic)
             else:
                 self.error_count += 1
-                self.logger.error(f"❌ Error publicando JSON en {topic}")
+                self.logger.error("❌ Error publicando JSON en %s", topic)
             
             return success
             
         except Exception as e:
             self.error_count += 1
-            self.logger.error(f"❌ Excepción publicando JSON: {e}")
+            self.logger.error("❌ Excepción publicando JSON: %s", e)
             return False
     
+    def publish_batch(self, messages: Iterable[Tuple[str, Dict[str, Any]]], qos: int = 0) -> int:
+        """
+        Publicar un lote de (topic, datos) JSON
+        Reutiliza el método publish_batch del MQTTClient existente
+        """
+        messages = list(messages)
+        if not self.is_connected:
+            self.logger.warning("⚠️ MQTT Publisher no conectado")
+            self.error_count += len(messages)
+            return 0
+        
+        try:
+            published = self.mqtt_client.publish_batch(messages, qos)
+            self.publish_count += published
+            self.error_count += len(messages) - published
+            self.logger.info("📤 Lote JSON publicado: %s/%s mensajes", published, len(messages))
+            return published
+            
+        except Exception as e:
+            self.error_count += len(messages)
+            self.logger.error("❌ Excepción publicando lote JSON: %s", e)
+            return 0
+    
     def get_status(self) -> Dict[str, Any]:
         """Obtener estado del publisher"""
         return {
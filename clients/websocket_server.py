@@ -9,14 +9,14 @@ import json
 from typing import Optional, Dict, Any
 from handlers.websocket_message_handler import WebSocketMessageHandler
 from clients.backend_client import BackendClient
-from config import AppConfig
+from config import AppConfig, get_config
 
 class WebSocketServer:
     """Servidor WebSocket puro - SOLO para WhatsApp, sin dependencias MQTT"""
     
-    def __init__(self, host: str = None, port: int = None, backend_client=None, whatsapp_service=None, enable_mqtt_publisher=False):
-        # Crear configuración completa
-        self.config = AppConfig()
+    def __init__(self, host: str = None, port: int = None, backend_client=None, whatsapp_service=None, enable_mqtt_publisher=False, config: AppConfig = None):
+        # Usar la configuración del servicio si se proporciona, sino crear una completa
+        self.config = config or get_config()
         
         # Usar configuración centralizada o parámetros proporcionados
         self.host = host or self.config.websocket.host
@@ -92,6 +92,19 @@ class WebSocketServer:
             
         self.logger.info("✅ Servidor WebSocket detenido")
     
+    async def force_stop(self):
+        """Cerrar el servidor sin esperar el cierre ordenado de las conexiones"""
+        self.is_running = False
+        
+        if self.server:
+            # Deja de aceptar conexiones; no se espera a wait_closed()
+            self.server.close()
+        
+        # Cancelar el procesamiento de WhatsApp que siga vivo
+        self.message_handler.cancel_whatsapp_processing()
+        
+        self.logger.warning("⚠️ Servidor WebSocket detenido forzosamente")
+    
     def set_message_handler(self, message_handler: WebSocketMessageHandler):
         """Establecer el manejador de mensajes"""
         self.message_handler = message_handler
@@ -102,6 +115,9 @@ class WebSocketServer:
     
     async def stop_whatsapp_processing(self):
         """Detener el procesamiento de la cola de WhatsApp"""
+        # Dejar de aceptar conexiones antes de vaciar la cola
+        if self.server:
+            self.server.close()
         await self.message_handler.stop_whatsapp_processing()
     
     async def clear_whatsapp_queue(self):
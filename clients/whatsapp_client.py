@@ -7,33 +7,92 @@ from typing import Dict, Any, Optional, List
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
+from utils.phone import clean_phone_number
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _dumps(data: Any) -> bytes:
+    """Serializar payload a JSON (usa orjson si está instalado)"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data).encode("utf-8")
+
+
+class _WhatsAppRetry(Retry):
+    """
+    Retry con reglas propias para la API de WhatsApp
+    
+    - POST solo se reintenta ante 429/503: en esos casos la API no procesó
+      el mensaje, con 502/504 podría haberlo enviado y se duplicaría.
+    - Un Retry-After mayor a RETRY_AFTER_MAX se ignora y se usa el backoff normal
+      para no bloquear el hilo de envío durante minutos.
+    """
+    
+    POST_STATUS_FORCELIST = frozenset([429, 503])
+    RETRY_AFTER_MAX = 10
+    
+    def is_retry(self, method: str, status_code: int, has_retry_after: bool = False) -> bool:
+        if method.upper() == "POST" and status_code not in self.POST_STATUS_FORCELIST:
+            return False
+        return super().is_retry(method, status_code, has_retry_after)
+    
+    def get_retry_after(self, response) -> Optional[float]:
+        retry_after = super().get_retry_after(response)
+        if retry_after is not None and retry_after > self.RETRY_AFTER_MAX:
+            return None
+        return retry_after
 
 
 class WhatsAppClient:
     """Cliente para comunicación con la API de WhatsApp"""
     
+    # Pool de conexiones keep-alive compartido por todos los envíos
+    POOL_CONNECTIONS = 32
+    POOL_MAXSIZE = 64
+    CONNECT_TIMEOUT = 3
+    
     def __init__(self, config):
         self.config = config
         self.base_url = config.api_url.rstrip('/')
         self.session = requests.Session()
         self.logger = logging.getLogger(__name__)
         
-        # Configurar reintentos automáticos
-        retry_strategy = Retry(
+        # Configurar reintentos automáticos con backoff exponencial.
+        # POST/PATCH se reintentan solo ante errores transitorios (rate limit o
+        # gateway caído) y se respeta el header Retry-After de la API.
+        # read=0: si la petición llegó a la API no se reenvía tras un timeout de lectura.
+        retry_strategy = _WhatsAppRetry(
             total=3,
-            backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504],
+            read=0,
+            backoff_factor=0.5,
+            backoff_max=10,
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=frozenset(["GET", "POST", "PATCH"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
         )
         
-        adapter = HTTPAdapter(max_retries=retry_strategy)
+        adapter = HTTPAdapter(
+            pool_connections=self.POOL_CONNECTIONS,
+            pool_maxsize=self.POOL_MAXSIZE,
+            max_retries=retry_strategy
+        )
         self.session.mount("http://", adapter)
         self.session.mount("https://", adapter)
         
         # Configurar headers por defecto
         self.session.headers.update({
             'Content-Type': 'application/json',
-            'User-Agent': 'MQTT-WhatsApp-Client/1.0'
+            'User-Agent': 'MQTT-WhatsApp-Client/1.0',
+            'Connection': 'keep-alive'
         })
+        
+        # (connect, read): fallar rápido si la API no acepta la conexión
+        self.timeout = (self.CONNECT_TIMEOUT, config.timeout)
     
     def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None, 
                      params: Optional[Dict] = None) -> Optional[Dict]:
@@ -44,13 +103,12 @@ class WhatsAppClient:
             response = self.session.request(
                 method=method,
                 url=url,
-                json=data,
+                data=_dumps(data) if data is not None else None,
                 params=params,
-                timeout=30
+                timeout=self.timeout
             )
             
             response.raise_for_status()
-            #print(f"📱 WhatsApp API Response: {response.status_code}")
             
             # Intentar parsear JSON
             try:
@@ -59,39 +117,41 @@ class WhatsAppClient:
                 return {'raw_response': response.text}
                 
         except requests.exceptions.RequestException as e:
-            self.logger.error(f"❌ ERROR EN PETICIÓN WHATSAPP:")
-            self.logger.error(f"   🔗 URL: {url}")
-            self.logger.error(f"   📝 Método: {method}")
-            self.logger.error(f"   ⚠️  Error: {e}")
+            self.logger.error("❌ ERROR EN PETICIÓN WHATSAPP:")
+            self.logger.error("   🔗 URL: %s", url)
+            self.logger.error("   📝 Método: %s", method)
+            self.logger.error("   ⚠️  Error: %s", e)
             if hasattr(e, 'response') and e.response is not None:
-                self.logger.error(f"   📊 Código HTTP: {e.response.status_code}")
-                self.logger.error(f"   📄 Texto respuesta: {e.response.text}")
+                self.logger.error("   📊 Código HTTP: %s", e.response.status_code)
+                self.logger.error("   📄 Texto respuesta: %s", e.response.text)
             return None
     
     def post(self, endpoint: str, data: Optional[Dict] = None) -> Optional[Dict]:
         """Realizar petición POST"""
         return self._make_request('POST', endpoint, data=data)
+    
+    def close(self) -> None:
+        """Cerrar la sesión HTTP y liberar las conexiones del pool"""
+        self.session.close()
+
     def send_location_request(self, phone:str,body_text:str) -> Optional[Dict]:
         """
         Enviar peticion de ubicacion al usuario en especifico.
         Este servicio no usa cola
         """
         try:
-            phone_clean= self._clean_phone_number(phone)
+            phone_clean= clean_phone_number(phone)
             data = {
                 "phone": phone_clean,
                 "body_text" : body_text
             }
             response = self.post(endpoint='/api/send-location-request',data=data)
             if response:
-                #print(f"✅ Mensaje individual de peticion de ubicacion enviado exitosamente")
                 return response
             else:
-                #print(f"❌ Error enviando mensaje  de peticion de ubicacion individual")
                 return None
         except Exception as e:
-            #print(f"💥 Error enviando mensaje de peticion de ubicaciion individual: {e}")
-            self.logger.error(f"Error enviando mensaje de peticion de ubicaciion individual: {e}")
+            self.logger.error("Error enviando mensaje de peticion de ubicaciion individual: %s", e)
             return None
     def send_individual_message(self, phone: str, message: str, use_queue: bool = False) -> Optional[Dict]:
         """
@@ -107,7 +167,7 @@ class WhatsAppClient:
         """
         try:
             # Validar formato del número
-            phone_clean = self._clean_phone_number(phone)
+            phone_clean = clean_phone_number(phone)
             
             data = {
                 "phone": phone_clean,
@@ -115,23 +175,15 @@ class WhatsAppClient:
                 "use_queue": use_queue
             }
             
-            #print(f"📱 Enviando mensaje individual:")
-            #print(f"   📞 Teléfono: {phone_clean}")
-            #print(f"   💬 Mensaje: {message[:50]}{'...' if len(message) > 50 else ''}")
-            #print(f"   🔄 Cola: {use_queue}")
-            
             response = self.post('/api/send-message', data=data)
             
             if response:
-                #print(f"✅ Mensaje individual enviado exitosamente")
                 return response
             else:
-                #print(f"❌ Error enviando mensaje individual")
                 return None
                 
         except Exception as e:
-            #print(f"💥 Error enviando mensaje individual: {e}")
-            self.logger.error(f"Error enviando mensaje individual: {e}")
+            self.logger.error("Error enviando mensaje individual: %s", e)
             return None
     
     def send_bulk_individual(self, recipients: List[Dict], use_queue: bool = True) -> Optional[Dict]:
@@ -151,24 +203,15 @@ class WhatsAppClient:
                 "use_queue": use_queue
             }
             
-            #print(f"📱 Enviando mensajes individuales masivos:")
-            #print(f"   📞 Destinatarios: {len(recipients)}")
-            #print(f"   🔄 Usar cola: {use_queue}")
-            
             response = self.post('/api/send-bulk', data=data)
             
             if response:
-                sent_count = response.get('sent_count', len(recipients))
-                #print(f"✅ Mensajes masivos enviados exitosamente:")
-                #print(f"   📤 Enviados: {sent_count}/{len(recipients)}")
                 return response
             else:
-                #print(f"❌ Error enviando mensajes masivos")
                 return None
                 
         except Exception as e:
-            #print(f"💥 Error enviando mensajes masivos: {e}")
-            self.logger.error(f"Error enviando mensajes masivos: {e}")
+            self.logger.error("Error enviando mensajes masivos: %s", e)
             return None
     
     def send_broadcast_message(self, phones: List[str], header_type: str, header_content: str, 
@@ -192,7 +235,7 @@ class WhatsAppClient:
         """
         try:
             # Limpiar números de teléfono
-            phones_clean = [self._clean_phone_number(phone) for phone in phones]
+            phones_clean = [clean_phone_number(phone) for phone in phones]
             
             data = {
                 "phones": phones_clean,
@@ -212,7 +255,7 @@ class WhatsAppClient:
                 return None
                 
         except Exception as e:
-            self.logger.error(f"Error enviando broadcast: {e}")
+            self.logger.error("Error enviando broadcast: %s", e)
             return None
     
     def send_personalized_broadcast(self, recipients: List[Dict], header_type: str, header_content: str, 
@@ -249,7 +292,7 @@ class WhatsAppClient:
                 return None
                 
         except Exception as e:
-            self.logger.error(f"Error enviando broadcast personalizado: {e}")
+            self.logger.error("Error enviando broadcast personalizado: %s", e)
             return None
     
     def send_list_message(self, phone: str, header_text: str, body_text: str, 
@@ -270,7 +313,7 @@ class WhatsAppClient:
         """
         try:
             # Validar formato del número
-            phone_clean = self._clean_phone_number(phone)
+            phone_clean = clean_phone_number(phone)
             
             data = {
                 "phone": phone_clean,
@@ -290,7 +333,7 @@ class WhatsAppClient:
                 return None
                 
         except Exception as e:
-            self.logger.error(f"Error enviando mensaje de lista: {str(e)[:200]}")
+            self.logger.error("Error enviando mensaje de lista: %s", str(e)[:200])
             return None
     def send_bulk_list_message(self, header_text: str, footer_text: str, button_text: str, 
                               sections: List[Dict], recipients: List[Dict], use_queue: bool = True) -> Optional[Dict]:
@@ -312,7 +355,7 @@ class WhatsAppClient:
             # Limpiar números de teléfono en recipients
             recipients_clean = []
             for recipient in recipients:
-                phone_clean = self._clean_phone_number(recipient["phone"])
+                phone_clean = clean_phone_number(recipient["phone"])
                 recipients_clean.append({
                     "phone": phone_clean,
                     "body_text": recipient["body_text"]
@@ -327,26 +370,15 @@ class WhatsAppClient:
                 "use_queue": use_queue
             }
             
-            #print(f"📱 Enviando bulk list message:")
-            ##print(f"   📋 Encabezado: {header_text[:50]}{'...' if len(header_text) > 50 else ''}")
-            #print(f"   📝 Pie: {footer_text[:30]}{'...' if len(footer_text) > 30 else ''}")
-            #print(f"   🔘 Botón: {button_text[:30]}{'...' if len(button_text) > 30 else ''}")
-            #print(f"   📋 Secciones: {len(sections)} secciones")
-            #print(f"   📞 Destinatarios: {len(recipients_clean)} números")
-            #print(f"   🔄 Cola: {use_queue}")
-            
             response = self.post('/api/send-bulk-list', data=data)
             
             if response:
-                #print(f"✅ Bulk list message enviado exitosamente a {len(recipients_clean)} números")
                 return response
             else:
-                #print(f"❌ Error enviando bulk list message")
                 return None
                 
         except Exception as e:
-            #print(f"💥 Error enviando bulk list message: {type(e).__name__}")
-            self.logger.error(f"Error enviando bulk list message: {str(e)[:200]}")
+            self.logger.error("Error enviando bulk list message: %s", str(e)[:200])
             return None
     
     def send_bulk_button_message(self, header_type: str, header_content: str, buttons: List[Dict], 
@@ -369,7 +401,7 @@ class WhatsAppClient:
             # Limpiar números de teléfono en recipients
             recipients_clean = []
             for recipient in recipients:
-                phone_clean = self._clean_phone_number(recipient["phone"])
+                phone_clean = clean_phone_number(recipient["phone"])
                 recipients_clean.append({
                     "phone": phone_clean,
                     "body_text": recipient["body_text"]
@@ -384,26 +416,15 @@ class WhatsAppClient:
                 "use_queue": use_queue
             }
             
-            #print(f"📱 Enviando bulk button message:")
-            #print(f"   📋 Encabezado tipo: {header_type}")
-            #print(f"   📋 Encabezado: {header_content}")
-            #print(f"   📝 Pie: {footer_text}")
-            #print(f"   🔘 Botones: {len(buttons)} botones")
-            #print(f"   📞 Destinatarios: {len(recipients_clean)} números")
-            #print(f"   🔄 Cola: {use_queue}")
-            
             response = self.post('/api/send-bulk-button', data=data)
             
             if response:
-                #print(f"✅ Bulk button message enviado exitosamente a {len(recipients_clean)} números")
                 return response
             else:
-                #print(f"❌ Error enviando bulk button message")
                 return None
                 
         except Exception as e:
-            #print(f"💥 Error enviando bulk button message: {type(e).__name__}")
-            self.logger.error(f"Error enviando bulk button message: {str(e)[:200]}")
+            self.logger.error("Error enviando bulk button message: %s", str(e)[:200])
             return None
     
     def send_personalized_broadcast_message(self, recipients: List[Dict], button_text: str, button_url: str,
@@ -413,7 +434,7 @@ class WhatsAppClient:
         try:
             recipients_clean = []
             for recipient in recipients:
-                phone_clean = self._clean_phone_number(recipient["phone"])
+                phone_clean = clean_phone_number(recipient["phone"])
                 body_text = recipient.get("body_text", "")
 
                 recipients_clean.append({
@@ -444,7 +465,7 @@ class WhatsAppClient:
             return None
 
         except Exception as e:
-            self.logger.error(f"Error enviando broadcast interactivo personalizado: {str(e)[:200]}")
+            self.logger.error("Error enviando broadcast interactivo personalizado: %s", str(e)[:200])
             return None
     
     def add_number_to_cache(self, phone: str, name: str = None, data: Dict = None, empresa_id: str = None) -> Optional[Dict]:
@@ -462,7 +483,7 @@ class WhatsAppClient:
         """
         try:
             # Validar formato del número
-            phone_clean = self._clean_phone_number(phone)
+            phone_clean = clean_phone_number(phone)
             
             payload = {
                 "phone": phone_clean,
@@ -473,23 +494,15 @@ class WhatsAppClient:
             if empresa_id:
                 payload["empresa_id"] = empresa_id
             
-            #print(f"📞 Agregando número al cache:")
-            #print(f"   📞 Teléfono: {phone_clean}")
-            #print(f"   👤 Nombre: {name or 'N/A'}")
-            #print(f"   📋 Datos: {len(str(data or {})) if data else 0} caracteres")
-            
             response = self.post('/api/numbers', data=payload)
             
             if response:
-                #print(f"✅ Número agregado al cache exitosamente")
                 return response
             else:
-                #print(f"❌ Error agregando número al cache")
                 return None
                 
         except Exception as e:
-            #print(f"💥 Error agregando número al cache: {type(e).__name__}")
-            self.logger.error(f"Error agregando número al cache: {str(e)[:200]}")
+            self.logger.error("Error agregando número al cache: %s", str(e)[:200])
             return None
     
     def update_number_cache(self, phone: str, data: Dict, empresa_id: str = None) -> Optional[Dict]:
@@ -506,7 +519,7 @@ class WhatsAppClient:
         """
         try:
             # Validar formato del número
-            phone_clean = self._clean_phone_number(phone)
+            phone_clean = clean_phone_number(phone)
             
             payload = {
                 "phone": phone_clean,
@@ -516,22 +529,15 @@ class WhatsAppClient:
             if empresa_id:
                 payload["empresa_id"] = empresa_id
             
-            #print(f"🔄 Actualizando información del cache:")
-            #print(f"   📞 Teléfono: {phone_clean}")
-            #print(f"   📋 Datos a actualizar: {data}")
-            
             response = self._make_request('PATCH', '/api/numbers/update', data=payload)
             
             if response:
-                #print(f"✅ Información del cache actualizada exitosamente")
                 return response
             else:
-                #print(f"❌ Error actualizando información del cache")
                 return None
                 
         except Exception as e:
-            #print(f"💥 Error actualizando información del cache: {type(e).__name__}")
-            self.logger.error(f"Error actualizando información del cache: {str(e)[:200]}")
+            self.logger.error("Error actualizando información del cache: %s", str(e)[:200])
             return None
 
     def send_bulk_template(self, recipients: List[Dict], use_queue: bool = True) -> Optional[Dict]:
@@ -579,7 +585,7 @@ class WhatsAppClient:
             # Limpiar números de teléfono en recipients
             recipients_clean = []
             for recipient in recipients:
-                phone_clean = self._clean_phone_number(recipient["phone"])
+                phone_clean = clean_phone_number(recipient["phone"])
                 recipient_clean = recipient.copy()
                 recipient_clean["phone"] = phone_clean
                 recipients_clean.append(recipient_clean)
@@ -589,23 +595,15 @@ class WhatsAppClient:
                 "use_queue": use_queue
             }
             
-            #print(f"📱 Enviando bulk template message:")
-            #print(f"   📞 Destinatarios: {len(recipients_clean)} números")
-            #print(f"   📋 Plantillas: {[r.get('template_name', 'N/A') for r in recipients_clean[:3]]}{'...' if len(recipients_clean) > 3 else ''}")
-            #print(f"   🔄 Cola: {use_queue}")
-            
             response = self.post('/api/send-bulk-template', data=data)
             
             if response:
-                #print(f"✅ Bulk template message enviado exitosamente a {len(recipients_clean)} números")
                 return response
             else:
-                #print(f"❌ Error enviando bulk template message")
                 return None
                 
         except Exception as e:
-            #print(f"💥 Error enviando bulk template message: {type(e).__name__}")
-            self.logger.error(f"Error enviando bulk template message: {str(e)[:200]}")
+            self.logger.error("Error enviando bulk template message: %s", str(e)[:200])
             return None
     
     def bulk_update_numbers(self, phones: List[str], data: Dict) -> Optional[Dict]:
@@ -631,73 +629,34 @@ class WhatsAppClient:
         """
         try:
             # Limpiar números de teléfono
-            phones_clean = [self._clean_phone_number(phone) for phone in phones]
+            phones_clean = [clean_phone_number(phone) for phone in phones]
             
             payload = {
                 "phones": phones_clean,
                 "data": data
             }
             
-            #print(f"🔄 Actualización masiva de números:")
-            #print(f"   📞 Números a actualizar: {len(phones_clean)}")
-            #print(f"   📋 Datos a actualizar: {data}")
-            
             response = self._make_request('PATCH', '/api/numbers/bulk-update', data=payload)
             
             if response:
-                updated_count = response.get('updated_count', len(phones_clean))
-                #print(f"✅ Actualización masiva completada exitosamente:")
-                #print(f"   📤 Actualizados: {updated_count}/{len(phones_clean)}")
                 return response
             else:
-                #print(f"❌ Error en actualización masiva")
                 return None
                 
         except Exception as e:
-            #print(f"💥 Error en actualización masiva: {type(e).__name__}")
-            self.logger.error(f"Error en actualización masiva: {str(e)[:200]}")
+            self.logger.error("Error en actualización masiva: %s", str(e)[:200])
             return None
     
-    def _clean_phone_number(self, phone: str) -> str:
-        """
-        Limpiar número de teléfono (remover +, espacios, guiones)
-        
-        Args:
-            phone: Número de teléfono en cualquier formato
-            
-        Returns:
-            Número limpio en formato internacional
-        """
-        # Remover caracteres no numéricos excepto +
-        cleaned = ''.join(char for char in phone if char.isdigit() or char == '+')
-        
-        # Remover + del inicio si existe
-        if cleaned.startswith('+'):
-            cleaned = cleaned[1:]
-        
-        # Validar que sea un número válido
-        if not cleaned.isdigit():
-            raise ValueError(f"Número de teléfono inválido: {phone}")
-        
-        # Asegurar que tenga al menos 10 dígitos
-        if len(cleaned) < 10:
-            raise ValueError(f"Número de teléfono muy corto: {phone}")
-        
-        return cleaned
-    
     def health_check(self) -> bool:
         """Verificar que la API de WhatsApp esté disponible"""
         try:
             response = self.session.get(f'{self.base_url}/health', timeout=10)
             if response.status_code == 200:
-                #print("✅ API de WhatsApp disponible")
                 return True
             else:
-                #print(f"❌ API de WhatsApp no disponible: {response.status_code}")
                 return False
         except Exception as e:
-            #print(f"❌ Error verificando API de WhatsApp: {e}")
-            self.logger.error(f"Error en health check WhatsApp: {e}")
+            self.logger.error("Error en health check WhatsApp: %s", e)
             return False
     
     def get_status(self) -> Dict[str, Any]:
@@ -2,8 +2,17 @@
 Módulo de configuración para la aplicación MQTT escalable
 """
 
+from functools import lru_cache
+
 from .settings import AppConfig, MQTTConfig, BackendConfig
 from .env_config import load_config_from_env
 # from .hardware_manager import HardwareManager, HardwareType  # ELIMINADO
 
-__all__ = ['AppConfig', 'MQTTConfig', 'BackendConfig', 'load_config_from_env']  # , 'HardwareManager', 'HardwareType']
+
+@lru_cache(maxsize=1)
+def get_config() -> AppConfig:
+    """Configuración de la aplicación compartida por todo el proceso (se construye una sola vez)"""
+    return AppConfig()
+
+
+__all__ = ['AppConfig', 'MQTTConfig', 'BackendConfig', 'load_config_from_env', 'get_config']  # , 'HardwareManager', 'HardwareType']
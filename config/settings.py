@@ -49,6 +49,7 @@ class WhatsAppConfig:
     """Configuración para API de WhatsApp"""
     api_url: str = os.getenv("WHATSAPP_API_URL", "http://localhost:5050")
     timeout: int = int(os.getenv("WHATSAPP_API_TIMEOUT", "30"))
+    health_check_ttl: float = float(os.getenv("WHATSAPP_HEALTH_CHECK_TTL", "2"))
     enabled: bool = True
 
 
@@ -74,6 +75,8 @@ class RedisConfig:
     # Configuración de colas WhatsApp
     whatsapp_queue_name: str = os.getenv("WHATSAPP_QUEUE_NAME", "whatsapp_messages")
     whatsapp_workers: int = int(os.getenv("WHATSAPP_WORKERS", "3"))
+    whatsapp_batch_size: int = int(os.getenv("WHATSAPP_BATCH_SIZE", "1"))
+    whatsapp_block_timeout: int = int(os.getenv("WHATSAPP_BLOCK_TIMEOUT", "5"))
     whatsapp_queue_ttl: int = int(os.getenv("WHATSAPP_QUEUE_TTL", "3600"))
 
 
@@ -1,8 +1,21 @@
 """
 Módulo de manejadores para procesamiento de mensajes
 """
+import importlib
 
-from .mqtt_message_handler import MQTTMessageHandler
-from .websocket_message_handler import WebSocketMessageHandler
+# Importación diferida: el servicio MQTT no carga el handler de WebSocket (Redis, etc.)
+_LAZY_EXPORTS = {
+    'MQTTMessageHandler': '.mqtt_message_handler',
+    'WebSocketMessageHandler': '.websocket_message_handler',
+}
 
 __all__ = ['MQTTMessageHandler', 'WebSocketMessageHandler']
+
+
+def __getattr__(name):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
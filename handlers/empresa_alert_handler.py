@@ -3,6 +3,7 @@ Handler específico para alertas desactivadas por empresa
 Solo maneja WhatsApp Service y MQTT Publisher
 """
 import logging
+import time
 from typing import Dict, Any, Optional, List
 
 from utils.alert_normalizer import (
@@ -12,12 +13,14 @@ from utils.alert_normalizer import (
 )
 from clients.mqtt_publisher_lite import MQTTPublisherLite
 from config.settings import MQTTConfig
+from utils.constants import WHATSAPP_AVAILABILITY_BUTTONS
 
 
 class EmpresaAlertHandler:
     """Handler específico para alertas desactivadas por empresa"""
     
-    def __init__(self, whatsapp_service=None, config=None, enable_mqtt_publisher=True):
+    def __init__(self, whatsapp_service=None, config=None, enable_mqtt_publisher=True,
+                 mqtt_publisher: Optional[MQTTPublisherLite] = None):
         self.whatsapp_service = whatsapp_service
         self.config = config
         self.logger = logging.getLogger(__name__)
@@ -29,9 +32,13 @@ class EmpresaAlertHandler:
         # Configurar pattern topic igual que en websocket handler
         self.pattern_topic = config.mqtt.topic if config else "empresas"
         
-        # MQTT Publisher para envío a dispositivos
-        self.mqtt_publisher = None
-        if enable_mqtt_publisher and config:
+        # MQTT Publisher para envío a dispositivos: si el llamador ya tiene uno
+        # conectado se reutiliza (una sola conexión al broker por proceso)
+        self.mqtt_publisher = mqtt_publisher
+        self._owns_mqtt_publisher = mqtt_publisher is None
+        if mqtt_publisher is not None:
+            self.logger.info("♻️ Empresa Handler reutilizando MQTT Publisher existente")
+        elif enable_mqtt_publisher and config:
             try:
                 publisher_config = MQTTConfig(
                     broker=config.mqtt.broker,
@@ -421,8 +428,7 @@ class EmpresaAlertHandler:
             
         try:
             success_count = 0
-            
-            self.logger.info(f"🔄 Enviando comandos de desactivación MQTT a {len(hardware_list)} dispositivos")
+            started = time.perf_counter()
             
             for hardware in hardware_list:
                 topic = hardware.get("topic", "")
@@ -453,11 +459,15 @@ class EmpresaAlertHandler:
                 
                 if success:
                     success_count += 1
-                    self.logger.info(f"✅ Hardware desactivado: {hardware_name} ({hardware_id})")
                 else:
-                    self.logger.error(f"❌ Error desactivando hardware: {hardware_name} - Topic: {full_topic}")
+                    self.logger.error(f"❌ Error desactivando hardware: {hardware_name} ({hardware_id}) - Topic: {full_topic}")
             
-            self.logger.info(f"📊 MQTT: {success_count}/{len(hardware_list)} dispositivos desactivados")
+            # Un solo resumen por lote en lugar de varias líneas por dispositivo
+            self.logger.info(
+                "📊 Desactivación MQTT: ok=%d fail=%d dt=%.1fms",
+                success_count, len(hardware_list) - success_count,
+                (time.perf_counter() - started) * 1000,
+            )
             return success_count > 0
             
         except Exception as e:
@@ -531,21 +541,13 @@ class EmpresaAlertHandler:
                 self.logger.warning("⚠️ No hay destinatarios válidos para WhatsApp")
                 return False
             
-            # Botones de acción
-            buttons = [
-                {
-                    "id": "Activar_User",
-                    "title": "Estoy disponible"
-                }
-            ]
-            
             # Enviar mensaje usando bulk_button_message
             if image_alert:
                 # Con imagen
                 response = self.whatsapp_service.send_bulk_button_message(
                     header_type="image",
                     header_content=image_alert,
-                    buttons=buttons,
+                    buttons=WHATSAPP_AVAILABILITY_BUTTONS,
                     footer_text=footer,
                     recipients=recipients,
                     use_queue=True
@@ -555,7 +557,7 @@ class EmpresaAlertHandler:
                 response = self.whatsapp_service.send_bulk_button_message(
                     header_type="text",
                     header_content=f"🚨 ALERTA {alert_name.upper()}",
-                    buttons=buttons,
+                    buttons=WHATSAPP_AVAILABILITY_BUTTONS,
                     footer_text=footer,
                     recipients=recipients,
                     use_queue=True
@@ -787,8 +789,7 @@ class EmpresaAlertHandler:
             
         try:
             success_count = 0
-            
-            self.logger.info(f"🔄 Enviando comandos de activación MQTT a {len(topics_hardware)} dispositivos")
+            started = time.perf_counter()
             
             for topic in topics_hardware:
                 # Construir topic completo igual que en MQTT handler
@@ -802,12 +803,14 @@ class EmpresaAlertHandler:
                 
                 if success:
                     success_count += 1
-                    hardware_name = topic.split("/")[-1] if "/" in topic else topic
-                    self.logger.info(f"✅ Hardware activado: {hardware_name}")
                 else:
                     self.logger.error(f"❌ Error activando hardware: {topic}")
             
-            self.logger.info(f"📊 MQTT: {success_count}/{len(topics_hardware)} dispositivos activados")
+            self.logger.info(
+                "📊 Activación MQTT: ok=%d fail=%d dt=%.1fms",
+                success_count, len(topics_hardware) - success_count,
+                (time.perf_counter() - started) * 1000,
+            )
             return success_count > 0
             
         except Exception as e:
@@ -918,7 +921,8 @@ class EmpresaAlertHandler:
     def stop(self):
         """Detener el handler y cerrar conexiones"""
         try:
-            if self.mqtt_publisher:
+            # El publisher compartido lo desconecta su dueño
+            if self.mqtt_publisher and self._owns_mqtt_publisher:
                 self.mqtt_publisher.disconnect()
                 self.logger.info("🔌 MQTT Publisher desconectado en Empresa Handler")
                 
@@ -13,9 +13,33 @@ from utils.alert_normalizer import (
     build_tv_topic,
     normalize_alert_to_tv,
 )
+from utils.constants import WHATSAPP_AVAILABILITY_BUTTONS
+from utils.hardware import hardware_kind
+from utils.serialization import json_text
 
 
 _DEDUP_WINDOW_SECONDS = 2
+# Claves que se copian de la respuesta del backend cuando no trae `alert`
+_ALERT_FALLBACK_KEYS = (
+    "topics_otros_hardware",
+    "numeros_telefonicos",
+    "activacion_alerta",
+    "ubicacion",
+    "elementos_necesarios",
+    "instrucciones",
+    "prioridad",
+    "tipo_alerta",
+    "nombre_alerta",
+    "empresa_nombre",
+    "empresa",
+    "sede",
+    "image_alert",
+    "imagen_base64",
+    "alert_id",
+    "_id",
+    "descripcion",
+    "fecha_creacion",
+)
 
 
 class MQTTMessageHandler:
@@ -68,20 +92,20 @@ class MQTTMessageHandler:
                 if len(parts_after_botonera) == 1:
                     hardware_name = parts_after_botonera[0]
                     
-                    self.logger.info(f"🚨 BOTONERA: {hardware_name} - {topic}")
+                    self.logger.info("🚨 BOTONERA: %s - %s", hardware_name, topic)
                     
                     # Verificar que el payload no sea de tipo desactivación
                     if payload and isinstance(payload, str):
                         try:
                             json_data = json.loads(payload)
                             if json_data.get("tipo_alarma") == "NORMAL":
-                                self.logger.info(f"⚠️ Ignorando mensaje de tipo NORMAL para {hardware_name}")
+                                self.logger.info("⚠️ Ignorando mensaje de tipo NORMAL para %s", hardware_name)
                                 return True
                         except json.JSONDecodeError:
-                            self.logger.error(f"❌ JSON inválido en payload: {payload}")
+                            self.logger.error("❌ JSON inválido en payload: %s", payload)
                             return False
                         except Exception as e:
-                            self.logger.error(f"❌ Error al procesar payload: {e}")
+                            self.logger.error("❌ Error al procesar payload: %s", e)
                             return False
                     
                     # Procesar JSON de BOTONERA (cualquier estructura)
@@ -95,11 +119,11 @@ class MQTTMessageHandler:
                         return True
                         
                     except json.JSONDecodeError as e:
-                        self.logger.error(f"❌ JSON inválido: {e}")
+                        self.logger.error("❌ JSON inválido: %s", e)
                         self.error_count += 1
                         return False
                     except Exception as e:
-                        self.logger.error(f"❌ Error procesando: {e}")
+                        self.logger.error("❌ Error procesando: %s", e)
                         self.error_count += 1
                         return False
                 else:
@@ -140,7 +164,7 @@ class MQTTMessageHandler:
             
             # Validar estructura del topic
             if len(topic_parts) < 5 or topic_parts[0] != "empresas":
-                self.logger.error(f"❌ Formato de topic inválido")
+                self.logger.error("❌ Formato de topic inválido")
                 return False
                 
             # Extraer partes del topic
@@ -174,11 +198,11 @@ class MQTTMessageHandler:
                 self._handle_alarm_notifications(response, mqtt_data)
                 return True
             else:
-                self.logger.error(f"❌ Error enviando alarma")
+                self.logger.error("❌ Error enviando alarma")
                 return False
                 
         except Exception as e:
-            self.logger.error(f"❌ Error: {e}")
+            self.logger.error("❌ Error: %s", e)
             return False
 
     def _handle_alarm_notifications(self, response: Dict, mqtt_data: Dict) -> None:
@@ -188,11 +212,11 @@ class MQTTMessageHandler:
             if self.logger.isEnabledFor(logging.INFO):
                 self.logger.info(
                     "📥 Respuesta cruda del backend: %s",
-                    json.dumps(response, ensure_ascii=False, default=str)
+                    json_text(response)
                 )
                 self.logger.info(
                     "🛰️ Payload original desde MQTT: %s",
-                    json.dumps(mqtt_data, ensure_ascii=False, default=str)
+                    json_text(mqtt_data)
                 )
 
             alert_data = self._resolve_alert_data(response, mqtt_data)
@@ -251,22 +275,32 @@ class MQTTMessageHandler:
                     cache_success
                 )
             
-            self.logger.info(f"✅ Procesamiento completo de notificaciones completado")
+            self.logger.info("✅ Procesamiento completo de notificaciones completado")
             
         except Exception as e:
-            self.logger.error(f"❌ Error manejando notificaciones: {e}")
+            self.logger.error("❌ Error manejando notificaciones: %s", e)
     
     def _intermediate_to_mqtt(self, alert, topics) -> None:
         """Enviar alertas a MQTT - IGUAL al WebSocket handler"""
         try:
-            # Enviar alerta a mqtt usando el mismo método que WebSocket
+            if not self.mqtt_publisher:
+                self.logger.warning("⚠️ No hay cliente MQTT publisher disponible")
+                return
+
+            # Construir todos los mensajes y publicarlos en un solo lote; el contenido
+            # depende solo del tipo de hardware, así que se calcula una vez por tipo
+            messages = []
+            data_by_kind = {}
             for topic in topics:
                 full_topic = self.pattern_topic + "/" + topic
-                message_hardware = self._select_data_hardware(alert=alert, topic=full_topic)
-                self.send_mqtt_message(topic=full_topic, message_data=message_hardware)
+                kind = hardware_kind(full_topic)
+                if kind not in data_by_kind:
+                    data_by_kind[kind] = self._select_data_hardware(alert=alert, topic=full_topic)
+                messages.append((full_topic, data_by_kind[kind]))
+            self.mqtt_publisher.publish_batch(messages)
 
         except Exception as ex:
-            self.logger.error(f"❌ Error en el intermediario a enviar mensajes al mqtt: {ex}")
+            self.logger.error("❌ Error en el intermediario a enviar mensajes al mqtt: %s", ex)
 
     def _resolve_alert_data(self, backend_response: Dict, mqtt_data: Dict) -> Dict:
         """Unificar los datos de alerta aunque el backend no entregue la clave `alert`"""
@@ -275,28 +309,7 @@ class MQTTMessageHandler:
             return alert_data
 
         derived: Dict[str, Any] = {}
-        keys_to_copy = [
-            "topics_otros_hardware",
-            "numeros_telefonicos",
-            "activacion_alerta",
-            "ubicacion",
-            "elementos_necesarios",
-            "instrucciones",
-            "prioridad",
-            "tipo_alerta",
-            "nombre_alerta",
-            "empresa_nombre",
-            "empresa",
-            "sede",
-            "image_alert",
-            "imagen_base64",
-            "alert_id",
-            "_id",
-            "descripcion",
-            "fecha_creacion",
-        ]
-
-        for key in keys_to_copy:
+        for key in _ALERT_FALLBACK_KEYS:
             value = backend_response.get(key)
             if value is not None:
                 derived[key] = value
@@ -349,11 +362,11 @@ class MQTTMessageHandler:
             if self.logger.isEnabledFor(logging.INFO):
                 self.logger.info(
                     "📨 alert_data utilizado para fanout MQTT: %s",
-                    json.dumps(alert_payload, ensure_ascii=False, default=str)
+                    json_text(alert_payload)
                 )
                 self.logger.info(
                     "🔁 mqtt_data de origen: %s",
-                    json.dumps(mqtt_data, ensure_ascii=False, default=str)
+                    json_text(mqtt_data)
                 )
 
             if not alert_payload.get("data"):
@@ -368,7 +381,7 @@ class MQTTMessageHandler:
             self._intermediate_to_mqtt(alert=alert_payload, topics=topics)
 
         except Exception as e:
-            self.logger.error(f"❌ Error enviando mensajes MQTT: {e}")
+            self.logger.error("❌ Error enviando mensajes MQTT: %s", e)
 
     def _select_data_hardware(self, topic, alert: Dict) -> Dict:
         """Seleccionar datos específicos según el tipo de hardware - IGUAL al WebSocket handler"""
@@ -389,10 +402,10 @@ class MQTTMessageHandler:
             try:
                 message_data = normalize_alert_to_tv(alert)
             except AlertNormalizationError as exc:
-                self.logger.error(f"❌ Error normalizando alerta para PANTALLA: {exc}")
+                self.logger.error("❌ Error normalizando alerta para PANTALLA: %s", exc)
                 message_data = {"alert": alert}
             except Exception as exc:
-                self.logger.error(f"❌ Error inesperado normalizando alerta para PANTALLA: {exc}")
+                self.logger.error("❌ Error inesperado normalizando alerta para PANTALLA: %s", exc)
                 message_data = {"alert": alert}
         else:
             message_data = {
@@ -425,10 +438,10 @@ class MQTTMessageHandler:
         try:
             normalized = normalize_alert_to_tv(alert_data)
         except AlertNormalizationError as exc:
-            self.logger.error(f"❌ Error normalizando alerta para TV: {exc}")
+            self.logger.error("❌ Error normalizando alerta para TV: %s", exc)
             return
         except Exception as exc:
-            self.logger.error(f"❌ Error inesperado normalizando alerta para TV: {exc}")
+            self.logger.error("❌ Error inesperado normalizando alerta para TV: %s", exc)
             return
 
         empresa, sede, pantalla = self._resolve_tv_topic_parts(alert_data, mqtt_data)
@@ -461,7 +474,7 @@ class MQTTMessageHandler:
             return success
 
         except Exception as e:
-            self.logger.error(f"❌ Error enviando mensaje de ubicación: {e}")
+            self.logger.error("❌ Error enviando mensaje de ubicación: %s", e)
             return False
 
     def _send_alert_created_template(
@@ -513,14 +526,14 @@ class MQTTMessageHandler:
             )
 
             if success:
-                self.logger.info(f"✅ Plantilla de alerta enviada a {len(template_recipients)} usuarios")
+                self.logger.info("✅ Plantilla de alerta enviada a %s usuarios", len(template_recipients))
                 return True
 
             self.logger.error("❌ Error enviando plantilla de alerta")
             return False
 
         except Exception as e:
-            self.logger.error(f"❌ Error enviando plantilla de alerta: {e}")
+            self.logger.error("❌ Error enviando plantilla de alerta: %s", e)
             return False
 
 
@@ -594,7 +607,7 @@ class MQTTMessageHandler:
             return bool(recipients_button or recipients_plain)
             
         except Exception as e:
-            self.logger.error(f"❌ Error enviando notificación de alarma: {e}")
+            self.logger.error("❌ Error enviando notificación de alarma: %s", e)
             return False
 
     def send_mqtt_message(self, topic: str, message_data: Dict, qos: int = 0) -> bool:
@@ -605,17 +618,17 @@ class MQTTMessageHandler:
                 success = self.mqtt_publisher.publish_json(topic, message_data, qos)
                 
                 if success:
-                    self.logger.info(f"✅ Mensaje MQTT enviado a topic: {topic}")
+                    self.logger.info("✅ Mensaje MQTT enviado a topic: %s", topic)
                     return True
                 else:
-                    self.logger.error(f"❌ Error enviando mensaje MQTT a topic: {topic}")
+                    self.logger.error("❌ Error enviando mensaje MQTT a topic: %s", topic)
                     return False
             else:
-                self.logger.warning(f"⚠️ No hay cliente MQTT publisher disponible")
+                self.logger.warning("⚠️ No hay cliente MQTT publisher disponible")
                 return False
                 
         except Exception as e:
-            self.logger.error(f"❌ Error enviando mensaje MQTT: {e}")
+            self.logger.error("❌ Error enviando mensaje MQTT: %s", e)
             return False
    
     def _send_create_active_user(self, alert: Dict, list_users: list, mqtt_data: Dict) -> bool:
@@ -642,26 +655,19 @@ class MQTTMessageHandler:
                 }
                 recipients.append(data)
                 
-            buttons = [
-                {
-                    "id": "Activar_User",
-                    "title": "Estoy disponible"
-                }
-            ]
-            
             self.whatsapp_service.send_bulk_button_message(
                 header_type="image",
                 header_content=image,
-                buttons=buttons,
+                buttons=WHATSAPP_AVAILABILITY_BUTTONS,
                 footer_text=footer,
                 recipients=recipients,
                 use_queue=True
             )
-            self.logger.info(f"✅ Notificación de activación de usuario enviada a {len(recipients)} usuarios")
+            self.logger.info("✅ Notificación de activación de usuario enviada a %s usuarios", len(recipients))
             return True
             
         except Exception as e:
-            self.logger.error(f"❌ Error enviando notificación de activación de usuario: {e}")
+            self.logger.error("❌ Error enviando notificación de activación de usuario: %s", e)
             return False
 
     def _create_bulk_cache(self, alarm_info: Dict, list_users: list, mqtt_data: Dict) -> bool:
@@ -715,14 +721,14 @@ class MQTTMessageHandler:
                         self.logger.debug(
                             "📝 Cache creado para usuario %s: %s",
                             user.get("numero"),
-                            json.dumps(cache_data, indent=2)
+                            json_text(cache_data, indent=True)
                         )
                 else:
-                    self.logger.warning(f'⚠️ Error creando cache para usuario {user.get("numero")}')
-            self.logger.info(f'✅ Cache masivo actualizado creado para {success_count}/{len(list_users)} usuarios')
+                    self.logger.warning('⚠️ Error creando cache para usuario %s', user.get("numero"))
+            self.logger.info('✅ Cache masivo actualizado creado para %s/%s usuarios', success_count, len(list_users))
             return success_count > 0
         except Exception as e:
-            self.logger.error(f'❌ Error creando cache masivo actualizado: {e}')
+            self.logger.error('❌ Error creando cache masivo actualizado: %s', e)
             return False
 
     def _extract_phone_number(self, data: Dict[str, Any]) -> str:
@@ -16,10 +16,16 @@ from utils.alert_normalizer import (
 )
 from clients.mqtt_publisher_lite import MQTTPublisherLite
 from config.settings import MQTTConfig
+from utils.constants import WHATSAPP_AVAILABILITY_BUTTONS, WHATSAPP_BUTTON_ACTIVATE_USER
 from handlers.empresa_alert_handler import EmpresaAlertHandler
+from utils.hardware import hardware_kind
 from datetime import datetime, timedelta
 
 
+# Tiempo máximo para terminar, en orden, la cola en memoria al detener el servicio
+_DRAIN_TIMEOUT = 5.0
+
+
 class WebSocketMessageHandler:
     """Manejador de mensajes WebSocket puro - SIN dependencias de MQTT"""
     
@@ -65,7 +71,8 @@ class WebSocketMessageHandler:
             self.empresa_handler = EmpresaAlertHandler(
                 whatsapp_service=whatsapp_service,
                 config=config,
-                enable_mqtt_publisher=enable_mqtt_publisher
+                enable_mqtt_publisher=enable_mqtt_publisher,
+                mqtt_publisher=self.mqtt_publisher
             )
         
         # Sistema de colas Redis para mensajes de WhatsApp ENTRANTES
@@ -84,6 +91,10 @@ class WebSocketMessageHandler:
         self.whatsapp_queue = Queue(maxsize=1000)
         self.is_processing = False
         self._queue_task = None
+        # Activado al detener: no se aceptan mensajes nuevos mientras se vacía la cola
+        self._stopping = False
+        # Parada de los workers Redis en curso (la lanza stop_whatsapp_processing)
+        self._redis_stop: Optional[asyncio.Future] = None
         
         self.logger.info("📱 WebSocket Message Handler - SOLO procesamiento WhatsApp")
         self.logger.info("❌ SIN procesamiento de mensajes MQTT")
@@ -95,9 +106,20 @@ class WebSocketMessageHandler:
         parts = str(name).strip().split()
         return parts[0] if parts else ""
 
+    def _get_whatsapp_message_id(self, json_message: Optional[Dict]) -> Optional[str]:
+        """Extraer el id del mensaje de WhatsApp del webhook, si lo tiene"""
+        try:
+            return json_message["entry"][0]["changes"][0]["value"]["messages"][0]["id"]
+        except (KeyError, IndexError, TypeError):
+            return None
+
     async def queue_whatsapp_message(self, message: str) -> bool:
         """Agregar mensaje de WhatsApp a la cola para procesamiento"""
         #print(f"🔍 DEBUG: Mensaje recibido en WebSocket: {message}")
+        json_message = None
+        if self._stopping:
+            self.logger.warning("⚠️ Procesador de WhatsApp deteniéndose, descartando mensaje")
+            return False
         try:
             # Primero verificar si es un mensaje de empresa
             try:
@@ -117,13 +139,17 @@ class WebSocketMessageHandler:
             # Procesar como mensaje normal de WhatsApp
             # Usar Redis si está disponible
             if self.redis_queue and self.redis_queue.is_healthy():
-                return self.redis_queue.add_message(message)
+                # Los reintentos del webhook repiten el id del mensaje de WhatsApp
+                return self.redis_queue.add_message(
+                    message, dedup_key=self._get_whatsapp_message_id(json_message)
+                )
             else:
                 # Fallback a cola en memoria
                 await self.whatsapp_queue.put(message)
                 
-                # Iniciar el procesador de cola si no está corriendo
-                if not self.is_processing:
+                # Iniciar el procesador de cola si no está corriendo (uno solo, para
+                # mantener el orden; is_processing se activa recién cuando la tarea arranca)
+                if self._queue_task is None or self._queue_task.done():
                     self._queue_task = asyncio.create_task(self._process_whatsapp_queue())
                 return True
         except asyncio.QueueFull:
@@ -139,25 +165,30 @@ class WebSocketMessageHandler:
         """Procesar mensajes de WhatsApp desde la cola de forma secuencial"""
         self.is_processing = True
         self.logger.info("🔄 Iniciando procesador de cola de WhatsApp")
+        loop = asyncio.get_running_loop()
         
         try:
             while True:
                 try:
                     # Obtener el siguiente mensaje de la cola
                     message = await self.whatsapp_queue.get()
-                    
-                    # Procesar el mensaje
-                    self._process_single_whatsapp_message_sync(message)
-                    
-                    # Marcar la tarea como completada
-                    self.whatsapp_queue.task_done()
-                    
+                except asyncio.CancelledError:
+                    self.logger.info("🛑 Procesador de cola cancelado")
+                    break
+                
+                try:
+                    # Procesar el mensaje en un hilo (hace HTTP bloqueante) sin
+                    # bloquear el event loop; se espera a que termine para mantener el orden
+                    await loop.run_in_executor(None, self._process_single_whatsapp_message_sync, message)
                 except asyncio.CancelledError:
                     self.logger.info("🛑 Procesador de cola cancelado")
                     break
                 except Exception as e:
                     self.logger.error(f"❌ Error procesando mensaje de cola: {e}")
                     self.whatsapp_error_count += 1
+                finally:
+                    # Marcar la tarea como completada (join() del apagado depende de esto)
+                    self.whatsapp_queue.task_done()
                     
         finally:
             self.is_processing = False
@@ -513,7 +544,7 @@ class WebSocketMessageHandler:
                         exist_alert.get("disponible")
                     )
                     #esto valida si es para activacion de un usuario
-                    if type_button == "Activar_User":
+                    if type_button == WHATSAPP_BUTTON_ACTIVATE_USER:
                         self.backend_client.update_user_status( alert_id = id_alert,
                                                                 usuario_id = id_user,
                                                                 disponible = True)
@@ -1323,7 +1354,7 @@ class WebSocketMessageHandler:
             success = self.mqtt_publisher.publish_json(topic, message_data, qos)
             
             if success:
-                self.logger.info(f"✅ Mensaje MQTT enviado desde WebSocket a topic: {topic}")
+                self.logger.debug("✅ Mensaje MQTT enviado desde WebSocket a topic: %s", topic)
                 return True
             else:
                 self.logger.error(f"❌ Error enviando mensaje MQTT desde WebSocket a topic: {topic}")
@@ -1344,6 +1375,10 @@ class WebSocketMessageHandler:
             "is_processing": self.is_processing
         }
         
+        # Contadores locales de la cola Redis (sin round-trips a Redis)
+        if self.redis_queue:
+            stats["redis_queue"] = self.redis_queue.get_local_statistics()
+        
         # Agregar estadísticas del handler de empresa si está disponible
         if self.empresa_handler:
             empresa_stats = self.empresa_handler.get_statistics()
@@ -1351,27 +1386,6 @@ class WebSocketMessageHandler:
         
         return stats
     
-    def _send_mqtt_message(self, topic: str, message_data: Dict, qos: int = 0) -> bool:
-        """Enviar mensajes MQTT a un topic específico"""
-        try:
-            # Usar mqtt_publisher si está disponible
-            if self.mqtt_publisher:
-                success = self.mqtt_publisher.publish_json(topic, message_data, qos)
-                
-                if success:
-                    self.logger.info(f"✅ Mensaje MQTT enviado a topic: {topic}")
-                    return True
-                else:
-                    self.logger.error(f"❌ Error enviando mensaje MQTT a topic: {topic}")
-                    return False
-            else:
-                self.logger.warning(f"⚠️ No hay cliente MQTT publisher disponible")
-                return False
-                
-        except Exception as e:
-            self.logger.error(f"❌ Error enviando mensaje MQTT: {e}")
-            return False
-
     def _resolve_tv_topic_parts(self, alert_data: Dict) -> tuple[str, str, str]:
         empresa = (
             alert_data.get("empresa")
@@ -1403,7 +1417,7 @@ class WebSocketMessageHandler:
 
         empresa, sede, pantalla = self._resolve_tv_topic_parts(alert_data)
         topic = build_tv_topic(empresa=empresa, sede=sede, pantalla=pantalla)
-        self._send_mqtt_message(topic=topic, message_data=normalized)
+        self.send_mqtt_message(topic=topic, message_data=normalized)
   
     def _send_create_down_alarma(self,list_users: list, alert: Dict, data_user: Dict = {}) -> bool:
         """Crear notificación de alarma por WhatsApp"""
@@ -1471,17 +1485,10 @@ class WebSocketMessageHandler:
                 }
                 recipients.append(data)
                 
-            buttons = [
-                {
-                    "id": "Activar_User",
-                    "title": "Estoy disponible"
-                }
-            ]
-            
             self.whatsapp_service.send_bulk_button_message(
                 header_type="image",
                 header_content=image,
-                buttons=buttons,
+                buttons=WHATSAPP_AVAILABILITY_BUTTONS,
                 footer_text=footer,
                 recipients=recipients,
                 use_queue=True
@@ -1496,11 +1503,20 @@ class WebSocketMessageHandler:
     def _intermediate_to_mqtt(self,topics,alert) -> None:
         try:
             #print(json.dumps(alert,indent=4))
-            #enviar alerta a mqtt
+            if not self.mqtt_publisher:
+                self.logger.warning("⚠️ No hay cliente MQTT publisher disponible")
+                return
+
+            #enviar alerta a mqtt en un solo lote (contenido calculado una vez por tipo de hardware)
+            messages = []
+            data_by_kind = {}
             for topic in topics:
                 topic = self.pattern_topic + "/" + topic
-                message_hardware = self._select_data_hardware(alert=alert,topic=topic)
-                self._send_mqtt_message(message_data=message_hardware,topic=topic)
+                kind = hardware_kind(topic)
+                if kind not in data_by_kind:
+                    data_by_kind[kind] = self._select_data_hardware(alert=alert,topic=topic)
+                messages.append((topic, data_by_kind[kind]))
+            self.mqtt_publisher.publish_batch(messages)
 
         except Exception as ex:
             self.logger.error(f"Error en el intermedario a enviar mensajes al mqtt {ex}")
@@ -1543,7 +1559,8 @@ class WebSocketMessageHandler:
     def _send_deactivation_to_mqtt(self, topics: list, prioridad: str) -> None:
         """Enviar comandos de desactivación MQTT a dispositivos hardware"""
         try:
-            self.logger.info(f"🔄 Enviando comandos de desactivación MQTT a {len(topics)} dispositivos")
+            started = time.perf_counter()
+            n_ok = n_fail = 0
             
             for topic in topics:
                 # Agregar pattern_topic igual que en activación
@@ -1553,12 +1570,17 @@ class WebSocketMessageHandler:
                 deactivation_message = self._create_deactivation_message(topic=topic, prioridad=prioridad)
                 
                 # Enviar mensaje MQTT con el topic completo
-                success = self._send_mqtt_message(message_data=deactivation_message, topic=full_topic)
-                
-                if success:
-                    self.logger.info(f"✅ Dispositivo desactivado: {topic.split('/')[-1]} ({topic.split('/')[-2]})")
+                if self.send_mqtt_message(message_data=deactivation_message, topic=full_topic):
+                    n_ok += 1
                 else:
-                    self.logger.error(f"❌ Error desactivando dispositivo: {topic}")
+                    n_fail += 1
+                    self.logger.error("❌ Error desactivando dispositivo: %s", topic)
+            
+            # Un solo resumen por lote en lugar de varias líneas por dispositivo
+            self.logger.info(
+                "📊 Desactivación MQTT: ok=%d fail=%d dt=%.1fms",
+                n_ok, n_fail, (time.perf_counter() - started) * 1000,
+            )
                     
         except Exception as ex:
             self.logger.error(f"❌ Error enviando comandos de desactivación MQTT: {ex}")
@@ -1700,26 +1722,45 @@ class WebSocketMessageHandler:
             return False
 
 
-    async def stop_whatsapp_processing(self):
+    def cancel_whatsapp_processing(self) -> None:
+        """Cancelar el procesamiento de WhatsApp sin esperar (descarta lo pendiente en memoria)"""
+        self._stopping = True
+        if self._queue_task and not self._queue_task.done():
+            self._queue_task.cancel()
+        # Si ya hay una parada ordenada esperando a los workers, no interferir
+        if self.redis_queue and self._redis_stop is None:
+            self.redis_queue.stop_workers(wait=False)
+
+    async def stop_whatsapp_processing(self, drain_timeout: float = _DRAIN_TIMEOUT):
         """Detener el procesamiento de la cola de WhatsApp"""
-        # Detener workers de Redis si existen
-        if self.redis_queue:
-            self.redis_queue.stop_workers()
+        loop = asyncio.get_running_loop()
+        self._stopping = True
         
-        # Detener empresa handler si existe
-        if self.empresa_handler:
-            self.empresa_handler.stop()
+        # Esperar los workers de Redis en un hilo mientras se vacía la cola en memoria
+        if self.redis_queue and self._redis_stop is None:
+            self._redis_stop = loop.run_in_executor(None, self.redis_queue.stop_workers)
         
-        # Detener cola en memoria si existe
-        if hasattr(self, '_queue_task') and self._queue_task and not self._queue_task.done():
-            self._queue_task.cancel()
+        # El procesador secuencial termina lo pendiente en orden, con un límite de tiempo
+        if self._queue_task and not self._queue_task.done():
+            try:
+                await asyncio.wait_for(self.whatsapp_queue.join(), timeout=drain_timeout)
+            except asyncio.TimeoutError:
+                self.logger.warning(
+                    "⚠️ Cola de WhatsApp sin vaciar tras %ss: %d mensajes descartados",
+                    drain_timeout, self.whatsapp_queue.qsize()
+                )
+            self.cancel_whatsapp_processing()
             try:
                 await self._queue_task
             except asyncio.CancelledError:
                 pass
         
-        if hasattr(self, 'is_processing'):
-            self.is_processing = False
+        if self._redis_stop is not None:
+            await self._redis_stop
+        
+        # Detener empresa handler al final: los mensajes pendientes pueden usarlo
+        if self.empresa_handler:
+            self.empresa_handler.stop()
         
         self.logger.info("🛑 Procesador de WhatsApp detenido")
 
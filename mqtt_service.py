@@ -6,21 +6,17 @@ Maneja SOLO conexiones MQTT, procesamiento de mensajes MQTT y comunicación con
 
 import signal
 import sys
-import os
 import logging
-import time
+import threading
 from typing import Dict, Any
 
-# Agregar el directorio actual al path para las importaciones
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-
 from clients.mqtt_client import MQTTClient
 from clients.backend_client import BackendClient
 from clients.mqtt_publisher_lite import MQTTPublisherLite
 from handlers.mqtt_message_handler import MQTTMessageHandler
 from services.whatsapp_service import WhatsAppService
 from utils.logger import setup_logger
-from config import AppConfig
+from config import get_config
 from config.settings import MQTTConfig
 
 
@@ -29,7 +25,7 @@ class MQTTService:
     
     def __init__(self):
         # Configuración
-        self.config = AppConfig()
+        self.config = get_config()
         # Logger con archivo separado para poder hacer tail -f
         self.logger = setup_logger(
             "mqtt_service", 
@@ -82,6 +78,8 @@ class MQTTService:
         # Estado del servicio
         self.is_running = False
         self.message_count = 0
+        # run() bloquea sobre este evento hasta que una señal o stop() lo activa
+        self._stop_event = threading.Event()
         
         # Configurar manejo de señales
         signal.signal(signal.SIGINT, self._signal_handler)
@@ -90,8 +88,8 @@ class MQTTService:
     def _signal_handler(self, signum, frame):
         """Manejar señales de terminación"""
         self.logger.info("\n¡Recibida señal de terminación para servicio MQTT!")
-        self.stop()
-        sys.exit(0)
+        # run() deja de esperar y ejecuta stop() en su finally
+        self._stop_event.set()
     
     def _setup_mqtt_callbacks(self):
         """Configurar callbacks para el cliente MQTT receptor"""
@@ -99,18 +97,22 @@ class MQTTService:
         def mqtt_message_callback(topic, payload, json_data):
             """Callback para procesar mensajes MQTT recibidos"""
             self.message_count += 1
-            self.logger.info(f"🎉 MENSAJE MQTT #{self.message_count} - TOPIC: {topic}")
+            self.logger.info("🎉 MENSAJE MQTT #%s - TOPIC: %s", self.message_count, topic)
             
             try:
                 success = self.message_handler.process_mqtt_message(topic, payload, json_data)
                 
                 if success:
-                    self.logger.info(f"✅ Mensaje MQTT #{self.message_count} procesado exitosamente")
+                    self.logger.info("✅ Mensaje MQTT #%s procesado exitosamente", self.message_count)
                 else:
-                    self.logger.error(f"❌ Error procesando mensaje MQTT #{self.message_count}")
+                    self.logger.error("❌ Error procesando mensaje MQTT #%s", self.message_count)
                     
             except Exception as e:
-                self.logger.error(f"❌ Excepción procesando mensaje MQTT: {e}")
+                self.logger.error("❌ Excepción procesando mensaje MQTT: %s", e)
+            
+            # Mostrar estadísticas cada 100 mensajes, una sola vez al alcanzarlos
+            if self.message_count % 100 == 0:
+                self._show_statistics()
         
         def mqtt_connect_callback(client, userdata, flags, rc):
             """Callback para conexión MQTT establecida"""
@@ -124,15 +126,15 @@ class MQTTService:
                 
                 for topic in topics_to_subscribe:
                     self.mqtt_receiver.subscribe(topic, qos=0)
-                    self.logger.info(f"🔍 Suscrito a: {topic}")
+                    self.logger.info("🔍 Suscrito a: %s", topic)
                     
             else:
-                self.logger.error(f"Error conectando al MQTT: {rc}")
+                self.logger.error("Error conectando al MQTT: %s", rc)
         
         def mqtt_disconnect_callback(client, userdata, rc):
             """Callback para desconexión MQTT"""
             if rc != 0:
-                self.logger.warning(f"Desconexión inesperada del broker MQTT: {rc}")
+                self.logger.warning("Desconexión inesperada del broker MQTT: %s", rc)
         
         # Asignar callbacks
         self.mqtt_receiver.set_message_callback(mqtt_message_callback)
@@ -142,9 +144,9 @@ class MQTTService:
     def start(self) -> bool:
         """Iniciar el servicio MQTT"""
         self.logger.info("🚀 Iniciando servicio MQTT independiente...")
-        self.logger.info(f"📡 Broker: {self.config.mqtt.broker}:{self.config.mqtt.port}")
-        self.logger.info(f"👤 Usuario: {self.config.mqtt.username}")
-        self.logger.info(f"📋 Topic base: {self.config.mqtt.topic}")
+        self.logger.info("📡 Broker: %s:%s", self.config.mqtt.broker, self.config.mqtt.port)
+        self.logger.info("👤 Usuario: %s", self.config.mqtt.username)
+        self.logger.info("📋 Topic base: %s", self.config.mqtt.topic)
         
         try:
             # Conectar MQTT Publisher
@@ -173,7 +175,7 @@ class MQTTService:
             return True
             
         except Exception as e:
-            self.logger.error(f"❌ Error iniciando servicio MQTT: {e}")
+            self.logger.error("❌ Error iniciando servicio MQTT: %s", e)
             return False
     
     def run(self):
@@ -183,13 +185,8 @@ class MQTTService:
             return False
         
         try:
-            # Mantener el servicio corriendo
-            while self.is_running:
-                time.sleep(1)
-                
-                # Mostrar estadísticas cada 5 minutos (300 segundos)
-                if self.message_count > 0 and self.message_count % 100 == 0:
-                    self._show_statistics()
+            # Mantener el servicio corriendo sin despertar cada segundo
+            self._stop_event.wait()
                     
         except KeyboardInterrupt:
             self.logger.info("Interrupción del usuario detectada")
@@ -202,6 +199,7 @@ class MQTTService:
         """Detener el servicio MQTT"""
         self.logger.info("🛑 Deteniendo servicio MQTT...")
         self.is_running = False
+        self._stop_event.set()
         
         try:
             # Detener receptor MQTT
@@ -215,36 +213,66 @@ class MQTTService:
                 self.mqtt_publisher.disconnect()
                 self.logger.info("✅ MQTT Publisher desconectado")
             
+            # Liberar conexiones HTTP del servicio WhatsApp
+            if hasattr(self, 'whatsapp_service') and self.whatsapp_service:
+                self.whatsapp_service.close()
+            
             # Mostrar estadísticas finales
             self._show_final_statistics()
             
         except Exception as e:
-            self.logger.error(f"❌ Error deteniendo servicio: {e}")
+            self.logger.error("❌ Error deteniendo servicio: %s", e)
     
     def _show_statistics(self):
         """Mostrar estadísticas del servicio"""
-        self.logger.info("📊 Estadísticas del servicio MQTT:")
-        self.logger.info(f"  • Mensajes procesados: {self.message_count}")
-        self.logger.info(f"  • Estado del receptor: {'Conectado' if self.mqtt_receiver.is_connected else 'Desconectado'}")
-        self.logger.info(f"  • Estado del publisher: {'Conectado' if self.mqtt_publisher.is_connected else 'Desconectado'}")
+        # Sin INFO habilitado no se consultan las estadísticas del handler
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
         
-        # Estadísticas del manejador de mensajes
         handler_stats = self.message_handler.get_statistics()
-        self.logger.info(f"  • Mensajes exitosos: {handler_stats['processed_messages']}")
-        self.logger.info(f"  • Errores: {handler_stats['error_count']}")
-        self.logger.info(f"  • Tasa de éxito: {100 - handler_stats['error_rate']}%")
         
+        # Un solo registro: una escritura (y un flush) por handler en vez de siete
+        self.logger.info(
+            "📊 Estadísticas del servicio MQTT:\n"
+            "  • Mensajes procesados: %s\n"
+            "  • Estado del receptor: %s\n"
+            "  • Estado del publisher: %s\n"
+            "  • Mensajes exitosos: %s\n"
+            "  • Errores: %s\n"
+            "  • Tasa de éxito: %s%%",
+            self.message_count,
+            'Conectado' if self.mqtt_receiver.is_connected else 'Desconectado',
+            'Conectado' if self.mqtt_publisher.is_connected else 'Desconectado',
+            handler_stats['processed_messages'],
+            handler_stats['error_count'],
+            100 - handler_stats['error_rate']
+        )
     
     def _show_final_statistics(self):
         """Mostrar estadísticas finales"""
-        self.logger.info("📊 Estadísticas finales del servicio MQTT:")
-        self.logger.info(f"  • Total de mensajes recibidos: {self.message_count}")
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        
+        if not hasattr(self, 'message_handler'):
+            self.logger.info(
+                "📊 Estadísticas finales del servicio MQTT:\n"
+                "  • Total de mensajes recibidos: %s",
+                self.message_count
+            )
+            return
         
-        if hasattr(self, 'message_handler'):
-            handler_stats = self.message_handler.get_statistics()
-            self.logger.info(f"  • Mensajes procesados exitosamente: {handler_stats['processed_messages']}")
-            self.logger.info(f"  • Errores totales: {handler_stats['error_count']}")
-            self.logger.info(f"  • Tasa de éxito final: {100 - handler_stats['error_rate']}%")
+        handler_stats = self.message_handler.get_statistics()
+        self.logger.info(
+            "📊 Estadísticas finales del servicio MQTT:\n"
+            "  • Total de mensajes recibidos: %s\n"
+            "  • Mensajes procesados exitosamente: %s\n"
+            "  • Errores totales: %s\n"
+            "  • Tasa de éxito final: %s%%",
+            self.message_count,
+            handler_stats['processed_messages'],
+            handler_stats['error_count'],
+            100 - handler_stats['error_rate']
+        )
     
     def get_status(self) -> Dict[str, Any]:
         """Obtener estado del servicio"""
@@ -5,50 +5,107 @@ Cada servicio se ejecuta completamente por separado
 """
 
 import argparse
+import runpy
+import signal
 import subprocess
 import sys
 import os
+import time
 
-def run_mqtt_service():
-    """Ejecutar SOLO el servicio MQTT"""
+# Segundos que se espera a que los servicios terminen antes de forzar SIGKILL
+SHUTDOWN_GRACE = 5
+
+# waitpid(-1), killpg y las sesiones propias solo existen en POSIX
+_POSIX = os.name == 'posix'
+
+# Script de cada servicio; solo se carga el del modo elegido
+SERVICE_SCRIPTS = {
+    'mqtt': 'mqtt_service.py',
+    'websocket': 'websocket_service.py',
+}
+
+def _script_path(service):
+    """Ruta absoluta del script de un servicio"""
+    return os.path.join(os.path.dirname(__file__), SERVICE_SCRIPTS[service])
+
+def run_service(service):
+    """Ejecutar SOLO un servicio ('mqtt' o 'websocket')"""
     
-    mqtt_script = os.path.join(os.path.dirname(__file__), 'mqtt_service.py')
-    return subprocess.run([sys.executable, mqtt_script])
+    # Ejecutar en este mismo intérprete (sin arrancar otro proceso Python);
+    # los módulos del otro servicio nunca se importan
+    runpy.run_path(_script_path(service), run_name='__main__')
+    return 0
 
-def run_websocket_service():
-    """Ejecutar SOLO el servicio WebSocket"""
+def _stop_group(process, force=False):
+    """Terminar (o forzar con SIGKILL) todo el grupo de procesos de un servicio"""
+    if not _POSIX:
+        # Windows: sin grupos POSIX, terminate y kill son equivalentes
+        if force:
+            process.kill()
+        else:
+            process.terminate()
+        return
     
-    websocket_script = os.path.join(os.path.dirname(__file__), 'websocket_service.py')
-    return subprocess.run([sys.executable, websocket_script])
+    try:
+        os.killpg(process.pid, signal.SIGKILL if force else signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+
+def _wait_any(processes):
+    """Esperar a que termine algún servicio y quitarlo de processes"""
+    if _POSIX:
+        # Bloquear en el kernel hasta que termine algún hijo (sin sondeo periódico)
+        pid, status = os.waitpid(-1, 0)
+        process = processes.pop(pid, None)
+        if process is not None:
+            # El hijo ya fue recogido: Popen no podrá leer su código de salida
+            process.returncode = os.waitstatus_to_exitcode(status)
+        return
+    
+    # Windows: sin waitpid(-1); esperar con plazo para que Ctrl+C siga llegando
+    for pid, process in list(processes.items()):
+        try:
+            process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            continue
+        processes.pop(pid)
+        return
 
 def run_both_services():
     """Ejecutar ambos servicios en procesos separados"""
     
-    import multiprocessing
+    # Lanzar los servicios directamente (sin un proceso intermedio por servicio)
+    processes = {}
+    for service in SERVICE_SCRIPTS:
+        # Sesión propia: el grupo incluye también los procesos que lance el servicio
+        process = subprocess.Popen([sys.executable, _script_path(service)], start_new_session=_POSIX)
+        processes[process.pid] = process
     
-    # Crear procesos separados
-    mqtt_process = multiprocessing.Process(target=run_mqtt_service)
-    websocket_process = multiprocessing.Process(target=run_websocket_service)
+    # Los hijos ya no reciben el Ctrl+C de la terminal: SIGTERM y SIGINT pasan por la limpieza
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
     
     try:
-        # Iniciar ambos procesos
-        mqtt_process.start()
-        websocket_process.start()
-        
-        
-        # Esperar a que terminen
-        mqtt_process.join()
-        websocket_process.join()
-        
+        while processes:
+            _wait_any(processes)
+            
     except KeyboardInterrupt:
         
-        # Terminar procesos
-        mqtt_process.terminate()
-        websocket_process.terminate()
+        # Una segunda señal no debe cortar la limpieza (ni el SIGKILL de respaldo)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        
+        # Terminar procesos (un solo killpg por servicio)
+        for process in processes.values():
+            _stop_group(process)
         
-        # Esperar a que terminen
-        mqtt_process.join()
-        websocket_process.join()
+        # Esperar a que terminen con un plazo común; forzar los que no respondan
+        deadline = time.monotonic() + SHUTDOWN_GRACE
+        for process in processes.values():
+            try:
+                process.wait(timeout=max(deadline - time.monotonic(), 0))
+            except subprocess.TimeoutExpired:
+                _stop_group(process, force=True)
+                process.wait()
         
 
 def main():
@@ -61,9 +118,9 @@ def main():
     args = parser.parse_args()
     
     if args.mqtt:
-        return run_mqtt_service()
+        return run_service('mqtt')
     elif args.websocket:
-        return run_websocket_service()
+        return run_service('websocket')
     elif args.both:
         return run_both_services()
     else:
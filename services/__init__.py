@@ -1,7 +1,21 @@
 """
 Servicios independientes para el sistema MQTT
 """
+import importlib
 
-from .mqtt_publisher_service import MQTTPublisherService
+# Importación diferida: importar services.whatsapp_service no debe cargar
+# el publisher MQTT (ni paho) si el proceso no lo usa
+_LAZY_EXPORTS = {
+    'MQTTPublisherService': '.mqtt_publisher_service',
+}
 
 __all__ = ['MQTTPublisherService']
+
+
+def __getattr__(name):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
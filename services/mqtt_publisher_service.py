@@ -5,7 +5,7 @@ Servicio independiente de publicación MQTT
 import logging
 from typing import Dict, Any, Optional
 from clients.mqtt_publisher_lite import MQTTPublisherLite
-from config import AppConfig
+from config import AppConfig, get_config
 
 class MQTTPublisherService:
     """
@@ -14,7 +14,7 @@ class MQTTPublisherService:
     """
     
     def __init__(self, config: AppConfig = None):
-        self.config = config or AppConfig()
+        self.config = config or get_config()
         self.logger = logging.getLogger(__name__)
         
         # Crear el mini cliente publisher
@@ -2,10 +2,75 @@
 Servicio de WhatsApp para envío de mensajes
 """
 import logging
+import threading
 import time
-from typing import Dict, Any, Optional, List
+from typing import Callable, Dict, Any, Optional, List, Tuple
 from clients.whatsapp_client import WhatsAppClient
 from config.settings import WhatsAppConfig
+from utils.phone import is_valid_phone
+
+_NAME_KEYS = ("nombre", "name")
+_PHONE_KEYS = ("phone", "numero")
+
+
+def _pick(data: Dict, keys: tuple, default: Any = "") -> Any:
+    """Retornar el primer valor no vacío entre las llaves indicadas"""
+    for key in keys:
+        value = data.get(key)
+        if value:
+            return value
+    return default
+
+
+def _recipient_phone(recipient: Any) -> Any:
+    """Obtener el número de un destinatario (str o dict con 'phone')"""
+    return recipient.get("phone") if isinstance(recipient, dict) else recipient
+
+
+def _dedupe_phones(phones: List[str]) -> List[str]:
+    """Eliminar números repetidos conservando el orden"""
+    return list(dict.fromkeys(phones))
+
+
+def _dedupe_recipients_by_phone(recipients: List[Dict]) -> List[Dict]:
+    """Eliminar destinatarios con número repetido conservando el primero"""
+    seen = set()
+    return [r for r in recipients if not (r["phone"] in seen or seen.add(r["phone"]))]
+
+
+def _dedupe_recipients_by_message(recipients: List[Dict]) -> List[Dict]:
+    """Eliminar destinatarios repetidos (mismo número y mismo mensaje)"""
+    seen = set()
+    unique = []
+    for recipient in recipients:
+        key = (recipient["phone"], recipient["message"])
+        if key not in seen:
+            seen.add(key)
+            unique.append(recipient)
+    return unique
+
+
+class _Stats:
+    """Contadores del servicio WhatsApp"""
+    
+    __slots__ = (
+        "start_time",
+        "individual_messages_sent",
+        "broadcast_messages_sent",
+        "total_recipients",
+        "errors",
+        "duplicates_pruned",
+        "invalid_phones",
+    )
+    
+    def __init__(self):
+        self.start_time = time.monotonic()
+        self.individual_messages_sent = 0
+        self.broadcast_messages_sent = 0
+        self.total_recipients = 0
+        self.errors = 0
+        self.duplicates_pruned = 0
+        self.invalid_phones = 0
 
 
 class WhatsAppService:
@@ -15,47 +80,119 @@ class WhatsAppService:
     
     def __init__(self, config: WhatsAppConfig):
         self.config = config
+        self._enabled = bool(config.enabled)
         self.logger = logging.getLogger(__name__)
         
         # Crear cliente WhatsApp
         self.client = WhatsAppClient(config)
         
         # Estadísticas del servicio
-        self.stats = {
-            "start_time": time.time(),
-            "individual_messages_sent": 0,
-            "broadcast_messages_sent": 0,
-            "total_recipients": 0,
-            "errors": 0
+        self.stats = _Stats()
+        self._stats_lock = threading.Lock()
+        
+        # Último resultado del health check: (timestamp monotónico, resultado)
+        self._hc_cache: Tuple[float, bool] = (0.0, False)
+        
+        # Procesadores de notificaciones por tipo
+        self._notification_handlers: Dict[str, Callable[[Dict[str, Any]], bool]] = {
+            'individual': self._process_individual_notification,
+            'broadcast': self._process_broadcast_notification,
         }
-    def send_location_request(self,phone:str,body_text:str) -> bool:
+    
+    def _record_sent(self, kind: str, sent_count: int, recipients: int, errors: int = 0) -> None:
+        """Registrar envío exitoso en las estadísticas (una sola sección bloqueada)"""
+        with self._stats_lock:
+            if kind == "broadcast":
+                self.stats.broadcast_messages_sent += sent_count
+            else:
+                self.stats.individual_messages_sent += sent_count
+            self.stats.total_recipients += recipients
+            self.stats.errors += errors
+    
+    def _record_error(self, count: int = 1) -> None:
+        """Registrar errores de envío en las estadísticas"""
+        with self._stats_lock:
+            self.stats.errors += count
+    
+    def _record_duplicates(self, count: int) -> None:
+        """Registrar destinatarios repetidos omitidos antes de enviar"""
+        with self._stats_lock:
+            self.stats.duplicates_pruned += count
+        self.logger.debug("Se omitieron %s destinatarios repetidos", count)
+    
+    def _record_invalid_phones(self, count: int) -> None:
+        """Registrar números descartados por formato inválido"""
+        with self._stats_lock:
+            self.stats.invalid_phones += count
+        self.logger.debug("Se omitieron %s números con formato inválido", count)
+    
+    def _prepare_recipients(self, recipients: List, dedupe: Optional[Callable[[List], List]] = None) -> List:
+        """Quitar destinatarios repetidos (si se indica dedupe) y números con formato inválido"""
+        prepared = dedupe(recipients) if dedupe else recipients
+        if len(prepared) != len(recipients):
+            self._record_duplicates(len(recipients) - len(prepared))
+        
+        valid = [r for r in prepared if is_valid_phone(_recipient_phone(r))]
+        if len(valid) != len(prepared):
+            self._record_invalid_phones(len(prepared) - len(valid))
+        return valid
+    
+    def _finish(self, kind: str, response: Optional[Dict], recipients: int) -> bool:
+        """
+        Registrar en las estadísticas el resultado de un envío
+        
+        Los broadcast cuentan como un mensaje; los individuales usan 'sent_count'
+        de la respuesta si la API lo informa.
+        """
+        if not response:
+            self._record_error()
+            return False
+        
+        if kind == "broadcast":
+            sent_count = 1
+        else:
+            sent_count = response.get("sent_count", recipients) if isinstance(response, dict) else recipients
+        self._record_sent(kind, sent_count, recipients)
+        return True
+    
+    def send_location_request(self, phone: str, body_text: str) -> bool:
+        """
+        Enviar mensaje individual de peticion de ubicacion
+        
+        Args:
+            phone: Número del destinatario (formato internacional)
+            body_text: Texto para el envío
+            
+        Returns:
+            bool: True si se envió exitosamente, False en caso contrario
+        """
         try:
-            """
-            Enviar mensaje individual de peticion de ubicacion
-            Args:
-            phone: Formato internacional
-            body_text: texto para el envio
-            """
-            if not self.config.enabled:
+            if not self._enabled:
                 self.logger.warning("⚠️ Servicio WhatsApp deshabilitado")
                 return False
             
+            if not is_valid_phone(phone):
+                self._record_invalid_phones(1)
+                self.logger.warning("⚠️ Número con formato inválido: %s", phone)
+                return False
             
             response = self.client.send_location_request(phone, body_text)
             
             if response:
-                self.stats["individual_messages_sent"] += 1
-                self.stats["total_recipients"] += 1
+                self._record_sent("individual", 1, 1)
                 
-                self.logger.info(f"Mensaje individual de peticion de ubicacion enviado a {phone}")
+                self.logger.info("Mensaje individual de peticion de ubicacion enviado a %s", phone)
                 return True
             else:
-                self.stats["errors"] += 1
-                self.logger.error(f"Error enviando mensaje de peticion de ubicacion individual a {phone}")
+                self._record_error()
+                self.logger.error("Error enviando mensaje de peticion de ubicacion individual a %s", phone)
                 return False
                 
         except Exception as e:
-            self.logger.error(f"Error en servicio WhatsApp: {e}")
+            self._record_error()
+            self.logger.error("Error en servicio WhatsApp: %s", e)
+            return False
+    
     def send_individual_message(self, phone: str, message: str, use_queue: bool = False) -> bool:
         """
         Enviar mensaje individual de WhatsApp
@@ -68,29 +205,28 @@ class WhatsAppService:
         Returns:
             bool: True si se envió exitosamente, False en caso contrario
         """
-        
         try:
-            if not self.config.enabled:
+            if not self._enabled:
                 self.logger.warning("⚠️ Servicio WhatsApp deshabilitado")
                 return False
             
+            if not is_valid_phone(phone):
+                self._record_invalid_phones(1)
+                self.logger.warning("⚠️ Número con formato inválido: %s", phone)
+                return False
             
             response = self.client.send_individual_message(phone, message, use_queue)
             
-            if response:
-                self.stats["individual_messages_sent"] += 1
-                self.stats["total_recipients"] += 1
-                
-                self.logger.info(f"Mensaje individual enviado a {phone}")
+            if self._finish("individual", response, 1):
+                self.logger.info("Mensaje individual enviado a %s", phone)
                 return True
-            else:
-                self.stats["errors"] += 1
-                self.logger.error(f"Error enviando mensaje individual a {phone}")
-                return False
-                
+            
+            self.logger.error("Error enviando mensaje individual a %s", phone)
+            return False
+            
         except Exception as e:
-            self.stats["errors"] += 1
-            self.logger.error(f"Error en servicio WhatsApp: {e}")
+            self._record_error()
+            self.logger.error("Error en servicio WhatsApp: %s", e)
             return False
     
     def send_bulk_individual(self, recipients: List[Dict], use_queue: bool = True) -> bool:
@@ -105,31 +241,30 @@ class WhatsAppService:
             bool: True si se envió exitosamente, False en caso contrario
         """
         try:
-            if not self.config.enabled:
+            if not self._enabled:
                 self.logger.warning("⚠️ Servicio WhatsApp deshabilitado")
                 return False
             
+            recipients = self._prepare_recipients(recipients, _dedupe_recipients_by_message)
+            if not recipients:
+                self.logger.warning("⚠️ No hay destinatarios válidos para enviar mensajes masivos individuales")
+                return False
             
             response = self.client.send_bulk_individual(
                 recipients=recipients,
                 use_queue=use_queue
             )
             
-            if response:
-                sent_count = response.get('sent_count', len(recipients))
-                self.stats["individual_messages_sent"] += sent_count
-                self.stats["total_recipients"] += len(recipients)
-                
-                self.logger.info(f"Mensajes masivos individuales enviados a {len(recipients)} destinatarios")
+            if self._finish("individual", response, len(recipients)):
+                self.logger.info("Mensajes masivos individuales enviados a %s destinatarios", len(recipients))
                 return True
-            else:
-                self.stats["errors"] += 1
-                self.logger.error(f"Error enviando mensajes masivos individuales a {len(recipients)} destinatarios")
-                return False
-                
+            
+            self.logger.error("Error enviando mensajes masivos individuales a %s destinatarios", len(recipients))
+            return False
+            
         except Exception as e:
-            self.stats["errors"] += 1
-            self.logger.error(f"Error en servicio WhatsApp masivo individual: {e}")
+            self._record_error()
+            self.logger.error("Error en servicio WhatsApp masivo individual: %s", e)
             return False
     
     def send_broadcast_message(self, phones: List[str], header_type: str, header_content: str,
@@ -152,10 +287,14 @@ class WhatsAppService:
             bool: True si se envió exitosamente, False en caso contrario
         """
         try:
-            if not self.config.enabled:
+            if not self._enabled:
                 self.logger.warning("⚠️ Servicio WhatsApp deshabilitado")
                 return False
             
+            phones = self._prepare_recipients(phones, _dedupe_phones)
+            if not phones:
+                self.logger.warning("⚠️ No hay destinatarios válidos para enviar broadcast")
+                return False
             
             response = self.client.send_broadcast_message(
                 phones=phones,
@@ -168,20 +307,16 @@ class WhatsAppService:
                 use_queue=use_queue
             )
             
-            if response:
-                self.stats["broadcast_messages_sent"] += 1
-                self.stats["total_recipients"] += len(phones)
-                
-                self.logger.info(f"Broadcast enviado a {len(phones)} números")
+            if self._finish("broadcast", response, len(phones)):
+                self.logger.info("Broadcast enviado a %s números", len(phones))
                 return True
-            else:
-                self.stats["errors"] += 1
-                self.logger.error(f"Error enviando broadcast a {len(phones)} números")
-                return False
-                
+            
+            self.logger.error("Error enviando broadcast a %s números", len(phones))
+            return False
+            
         except Exception as e:
-            self.stats["errors"] += 1
-            self.logger.error(f"Error en servicio WhatsApp broadcast: {e}")
+            self._record_error()
+            self.logger.error("Error en servicio WhatsApp broadcast: %s", e)
             return False
     
     def send_personalized_broadcast(self, recipients: List[Dict], header_type: str, header_content: str,
@@ -202,10 +337,14 @@ class WhatsAppService:
             bool: True si se envió exitosamente, False en caso contrario
         """
         try:
-            if not self.config.enabled:
+            if not self._enabled:
                 self.logger.warning("⚠️ Servicio WhatsApp deshabilitado")
                 return False
             
+            recipients = self._prepare_recipients(recipients, _dedupe_recipients_by_phone)
+            if not recipients:
+                self.logger.warning("⚠️ No hay destinatarios válidos para enviar broadcast personalizado")
+                return False
             
             response = self.client.send_personalized_broadcast(
                 recipients=recipients,
@@ -217,20 +356,16 @@ class WhatsAppService:
                 use_queue=use_queue
             )
             
-            if response:
-                self.stats["broadcast_messages_sent"] += 1
-                self.stats["total_recipients"] += len(recipients)
-                
-                self.logger.info(f"Broadcast personalizado enviado a {len(recipients)} destinatarios")
+            if self._finish("broadcast", response, len(recipients)):
+                self.logger.info("Broadcast personalizado enviado a %s destinatarios", len(recipients))
                 return True
-            else:
-                self.stats["errors"] += 1
-                self.logger.error(f"Error enviando broadcast personalizado a {len(recipients)} destinatarios")
-                return False
-                
+            
+            self.logger.error("Error enviando broadcast personalizado a %s destinatarios", len(recipients))
+            return False
+            
         except Exception as e:
-            self.stats["errors"] += 1
-            self.logger.error(f"Error en servicio WhatsApp broadcast personalizado: {e}")
+            self._record_error()
+            self.logger.error("Error en servicio WhatsApp broadcast personalizado: %s", e)
             return False
     
     def send_list_message(self, phone: str, header_text: str, body_text: str, 
@@ -250,10 +385,14 @@ class WhatsAppService:
             bool: True si se envió exitosamente, False en caso contrario
         """
         try:
-            if not self.config.enabled:
+            if not self._enabled:
                 self.logger.warning("⚠️ Servicio WhatsApp deshabilitado")
                 return False
             
+            if not is_valid_phone(phone):
+                self._record_invalid_phones(1)
+                self.logger.warning("⚠️ Número con formato inválido: %s", phone)
+                return False
             
             response = self.client.send_list_message(
                 phone=phone,
@@ -264,20 +403,16 @@ class WhatsAppService:
                 sections=sections
             )
             
-            if response:
-                self.stats["individual_messages_sent"] += 1
-                self.stats["total_recipients"] += 1
-                
-                self.logger.info(f"Mensaje de lista enviado a {phone}")
+            if self._finish("individual", response, 1):
+                self.logger.info("Mensaje de lista enviado a %s", phone)
                 return True
-            else:
-                self.stats["errors"] += 1
-                self.logger.error(f"Error enviando mensaje de lista a {phone}")
-                return False
-                
+            
+            self.logger.error("Error enviando mensaje de lista a %s", phone)
+            return False
+            
         except Exception as e:
-            self.stats["errors"] += 1
-            self.logger.error(f"Error en servicio WhatsApp enviando lista: {e}")
+            self._record_error()
+            self.logger.error("Error en servicio WhatsApp enviando lista: %s", e)
             return False
     
     def send_bulk_list_message(self, header_text: str, footer_text: str, button_text: str, 
@@ -297,10 +432,14 @@ class WhatsAppService:
             bool: True si se envió exitosamente, False en caso contrario
         """
         try:
-            if not self.config.enabled:
+            if not self._enabled:
                 self.logger.warning("⚠️ Servicio WhatsApp deshabilitado")
                 return False
             
+            recipients = self._prepare_recipients(recipients)
+            if not recipients:
+                self.logger.warning("⚠️ No hay destinatarios válidos para enviar bulk list")
+                return False
             
             response = self.client.send_bulk_list_message(
                 header_text=header_text,
@@ -311,21 +450,16 @@ class WhatsAppService:
                 use_queue=use_queue
             )
             
-            if response:
-                # Actualizar estadísticas - consideramos bulk list como un broadcast
-                self.stats["broadcast_messages_sent"] += 1
-                self.stats["total_recipients"] += len(recipients)
-                
-                self.logger.info(f"Bulk list enviado a {len(recipients)} destinatarios")
+            if self._finish("broadcast", response, len(recipients)):
+                self.logger.info("Bulk list enviado a %s destinatarios", len(recipients))
                 return True
-            else:
-                self.stats["errors"] += 1
-                self.logger.error(f"Error enviando bulk list a {len(recipients)} destinatarios")
-                return False
-                
+            
+            self.logger.error("Error enviando bulk list a %s destinatarios", len(recipients))
+            return False
+            
         except Exception as e:
-            self.stats["errors"] += 1
-            self.logger.error(f"Error en servicio WhatsApp bulk list: {e}")
+            self._record_error()
+            self.logger.error("Error en servicio WhatsApp bulk list: %s", e)
             return False
     
     def send_bulk_button_message(self, header_type: str, header_content: str, buttons: List[Dict], 
@@ -345,10 +479,14 @@ class WhatsAppService:
             bool: True si se envió exitosamente, False en caso contrario
         """
         try:
-            if not self.config.enabled:
+            if not self._enabled:
                 self.logger.warning("⚠️ Servicio WhatsApp deshabilitado")
                 return False
             
+            recipients = self._prepare_recipients(recipients)
+            if not recipients:
+                self.logger.warning("⚠️ No hay destinatarios válidos para enviar bulk button")
+                return False
             
             response = self.client.send_bulk_button_message(
                 header_type=header_type,
@@ -359,23 +497,18 @@ class WhatsAppService:
                 use_queue=use_queue
             )
             
-            if response:
-                # Actualizar estadísticas - consideramos bulk button como un broadcast
-                self.stats["broadcast_messages_sent"] += 1
-                self.stats["total_recipients"] += len(recipients)
-                
-                self.logger.info(f"Bulk button enviado a {len(recipients)} destinatarios")
+            if self._finish("broadcast", response, len(recipients)):
+                self.logger.info("Bulk button enviado a %s destinatarios", len(recipients))
                 return True
-            else:
-                self.stats["errors"] += 1
-                self.logger.error(f"Error enviando bulk button a {len(recipients)} destinatarios")
-                return False
-                
+            
+            self.logger.error("Error enviando bulk button a %s destinatarios", len(recipients))
+            return False
+            
         except Exception as e:
-            self.stats["errors"] += 1
-            self.logger.error(f"Error en servicio WhatsApp bulk button: {e}")
+            self._record_error()
+            self.logger.error("Error en servicio WhatsApp bulk button: %s", e)
             return False
-
+    
     def send_bulk_location_button_message(
         self,
         recipients: List[Dict],
@@ -385,7 +518,7 @@ class WhatsAppService:
     ) -> bool:
         """Enviar ubicación mediante CTA 'Abrir en Maps' usando broadcast personalizado"""
 
-        if not self.config.enabled:
+        if not self._enabled:
             self.logger.warning("⚠️ Servicio WhatsApp deshabilitado")
             return False
 
@@ -399,8 +532,8 @@ class WhatsAppService:
 
             enriched_recipients = []
             for recipient in recipients:
-                name = (recipient.get("nombre") or recipient.get("name") or "").strip()
-                phone = recipient.get("phone") or recipient.get("numero")
+                name = _pick(recipient, _NAME_KEYS).strip()
+                phone = _pick(recipient, _PHONE_KEYS, None)
 
                 if not phone:
                     self.logger.debug("⚠️ Se omite destinatario sin número válido en ubicación")
@@ -435,20 +568,19 @@ class WhatsAppService:
             )
 
             if response:
-                self.stats["broadcast_messages_sent"] += 1
-                self.stats["total_recipients"] += len(enriched_recipients)
+                self._record_sent("broadcast", 1, len(enriched_recipients))
                 self.logger.info(
-                    f"✅ Mensaje de ubicación enviado a {len(enriched_recipients)} destinatarios"
+                    "✅ Mensaje de ubicación enviado a %s destinatarios", len(enriched_recipients)
                 )
                 return True
 
-            self.stats["errors"] += 1
+            self._record_error()
             self.logger.error("❌ Error enviando mensaje de ubicación con CTA")
             return False
 
         except Exception as e:
-            self.stats["errors"] += 1
-            self.logger.error(f"❌ Error en envío de ubicación con CTA: {e}")
+            self._record_error()
+            self.logger.error("❌ Error en envío de ubicación con CTA: %s", e)
             return False
     
     def add_number_to_cache(self, phone: str, name: str = None, data: Dict = None, empresa_id: str = None) -> bool:
@@ -465,22 +597,27 @@ class WhatsAppService:
             bool: True si se agregó exitosamente, False en caso contrario
         """
         try:
-            if not self.config.enabled:
+            if not self._enabled:
                 self.logger.warning("⚠️ Servicio WhatsApp deshabilitado")
                 return False
             
+            if not is_valid_phone(phone):
+                self._record_invalid_phones(1)
+                self.logger.warning("⚠️ Número con formato inválido: %s", phone)
+                return False
             
             response = self.client.add_number_to_cache(phone, name, data, empresa_id=empresa_id)
             
             if response:
-                self.logger.info(f"Número {phone} agregado al cache")
+                self.logger.info("Número %s agregado al cache", phone)
                 return True
             else:
-                self.logger.error(f"Error agregando número {phone} al cache")
+                self.logger.error("Error agregando número %s al cache", phone)
                 return False
                 
         except Exception as e:
-            self.logger.error(f"Error en servicio WhatsApp agregando al cache: {e}")
+            self._record_error()
+            self.logger.error("Error en servicio WhatsApp agregando al cache: %s", e)
             return False
     
     def update_number_cache(self, phone: str, data: Dict, empresa_id: str = None) -> bool:
@@ -496,22 +633,27 @@ class WhatsAppService:
             bool: True si se actualizó exitosamente, False en caso contrario
         """
         try:
-            if not self.config.enabled:
+            if not self._enabled:
                 self.logger.warning("⚠️ Servicio WhatsApp deshabilitado")
                 return False
             
+            if not is_valid_phone(phone):
+                self._record_invalid_phones(1)
+                self.logger.warning("⚠️ Número con formato inválido: %s", phone)
+                return False
             
             response = self.client.update_number_cache(phone, data, empresa_id=empresa_id)
             
             if response:
-                self.logger.info(f"Cache del número {phone} actualizado con datos: {data}")
+                self.logger.info("Cache del número %s actualizado con datos: %s", phone, data)
                 return True
             else:
-                self.logger.error(f"Error actualizando cache del número {phone}")
+                self.logger.error("Error actualizando cache del número %s", phone)
                 return False
                 
         except Exception as e:
-            self.logger.error(f"Error en servicio WhatsApp actualizando cache: {e}")
+            self._record_error()
+            self.logger.error("Error en servicio WhatsApp actualizando cache: %s", e)
             return False
 
     def send_bulk_template(self, recipients: List[Dict], use_queue: bool = True) -> bool:
@@ -556,31 +698,30 @@ class WhatsAppService:
             ]
         """
         try:
-            if not self.config.enabled:
+            if not self._enabled:
                 self.logger.warning("⚠️ Servicio WhatsApp deshabilitado")
                 return False
             
+            recipients = self._prepare_recipients(recipients)
+            if not recipients:
+                self.logger.warning("⚠️ No hay destinatarios válidos para enviar bulk template")
+                return False
             
             response = self.client.send_bulk_template(
                 recipients=recipients,
                 use_queue=use_queue
             )
             
-            if response:
-                # Actualizar estadísticas - consideramos bulk template como broadcast
-                self.stats["broadcast_messages_sent"] += 1
-                self.stats["total_recipients"] += len(recipients)
-                
-                self.logger.info(f"Bulk template enviado a {len(recipients)} destinatarios")
+            if self._finish("broadcast", response, len(recipients)):
+                self.logger.info("Bulk template enviado a %s destinatarios", len(recipients))
                 return True
-            else:
-                self.stats["errors"] += 1
-                self.logger.error(f"Error enviando bulk template a {len(recipients)} destinatarios")
-                return False
-                
+            
+            self.logger.error("Error enviando bulk template a %s destinatarios", len(recipients))
+            return False
+            
         except Exception as e:
-            self.stats["errors"] += 1
-            self.logger.error(f"Error en servicio WhatsApp bulk template: {e}")
+            self._record_error()
+            self.logger.error("Error en servicio WhatsApp bulk template: %s", e)
             return False
     
     def bulk_update_numbers(self, phones: List[str], data: Dict) -> bool:
@@ -595,23 +736,28 @@ class WhatsAppService:
             bool: True si se actualizó exitosamente, False en caso contrario
         """
         try:
-            if not self.config.enabled:
+            if not self._enabled:
                 self.logger.warning("⚠️ Servicio WhatsApp deshabilitado")
                 return False
             
+            unique_phones = _dedupe_phones(phones)
+            if len(unique_phones) != len(phones):
+                self._record_duplicates(len(phones) - len(unique_phones))
+                phones = unique_phones
             
             response = self.client.bulk_update_numbers(phones, data)
             
             if response:
                 updated_count = response.get('updated_count', len(phones))
-                self.logger.info(f"Actualización masiva completada: {updated_count}/{len(phones)} números actualizados con datos: {data}")
+                self.logger.info("Actualización masiva completada: %s/%s números actualizados con datos: %s", updated_count, len(phones), data)
                 return True
             else:
-                self.logger.error(f"Error en actualización masiva de {len(phones)} números")
+                self.logger.error("Error en actualización masiva de %s números", len(phones))
                 return False
                 
         except Exception as e:
-            self.logger.error(f"Error en servicio WhatsApp actualización masiva: {e}")
+            self._record_error()
+            self.logger.error("Error en servicio WhatsApp actualización masiva: %s", e)
             return False
     
     def process_whatsapp_notification(self, notification: Dict[str, Any]) -> bool:
@@ -625,17 +771,12 @@ class WhatsAppService:
             bool: True si se procesó exitosamente
         """
         try:
-            message_type = notification.get('type', 'individual')
+            handler = self._notification_handlers.get(notification.get('type', 'individual'))
             
-            if message_type == 'individual':
-                return self._process_individual_notification(notification)
-            elif message_type == 'broadcast':
-                return self._process_broadcast_notification(notification)
-            else:
-                return False
+            return handler(notification) if handler else False
                 
         except Exception as e:
-            self.logger.error(f"Error procesando notificación WhatsApp: {e}")
+            self.logger.error("Error procesando notificación WhatsApp: %s", e)
             return False
     
     def _process_individual_notification(self, notification: Dict[str, Any]) -> bool:
@@ -683,31 +824,44 @@ class WhatsAppService:
             return False
     
     def health_check(self) -> bool:
-        """Verificar estado del servicio WhatsApp"""
+        """Verificar estado del servicio WhatsApp (cacheado por health_check_ttl segundos)"""
         try:
-            if not self.config.enabled:
+            if not self._enabled:
                 return False
             
-            return self.client.health_check()
+            now = time.monotonic()
+            checked_at, healthy = self._hc_cache
+            if checked_at and now - checked_at < self.config.health_check_ttl:
+                return healthy
+            
+            healthy = self.client.health_check()
+            self._hc_cache = (now, healthy)
+            return healthy
             
         except Exception as e:
-            self.logger.error(f"Error en health check WhatsApp: {e}")
+            self.logger.error("Error en health check WhatsApp: %s", e)
             return False
     
+    def close(self) -> None:
+        """Liberar las conexiones HTTP del cliente WhatsApp"""
+        self.client.close()
+    
     def get_status(self) -> Dict[str, Any]:
         """Obtener estado completo del servicio"""
         try:
-            uptime = time.time() - self.stats["start_time"]
+            uptime = time.monotonic() - self.stats.start_time
             client_status = self.client.get_status()
             
             return {
                 "service": {
-                    "enabled": self.config.enabled,
+                    "enabled": self._enabled,
                     "uptime_seconds": round(uptime, 2),
-                    "individual_messages_sent": self.stats["individual_messages_sent"],
-                    "broadcast_messages_sent": self.stats["broadcast_messages_sent"],
-                    "total_recipients": self.stats["total_recipients"],
-                    "errors": self.stats["errors"],
+                    "individual_messages_sent": self.stats.individual_messages_sent,
+                    "broadcast_messages_sent": self.stats.broadcast_messages_sent,
+                    "total_recipients": self.stats.total_recipients,
+                    "errors": self.stats.errors,
+                    "duplicates_pruned": self.stats.duplicates_pruned,
+                    "invalid_phones": self.stats.invalid_phones,
                     "success_rate": self._calculate_success_rate()
                 },
                 "client": client_status
@@ -725,26 +879,27 @@ class WhatsAppService:
                 }
             }
     
-    def _calculate_success_rate(self) -> float:
-        """Calcular tasa de éxito"""
-        total_attempts = (
-            self.stats["individual_messages_sent"] + 
-            self.stats["broadcast_messages_sent"] + 
-            self.stats["errors"]
-        )
+    def _success_rate_bp(self) -> int:
+        """Tasa de éxito en puntos básicos, redondeada con enteros (10000 si aún no hay intentos)"""
+        stats = self.stats
+        successful = stats.individual_messages_sent + stats.broadcast_messages_sent
+        total_attempts = successful + stats.errors
+        if not total_attempts:
+            return 10000
         
-        if total_attempts == 0:
-            return 100.0
-        
-        successful = self.stats["individual_messages_sent"] + self.stats["broadcast_messages_sent"]
-        return round((successful / total_attempts) * 100, 2)
+        # successful * 10000 / total_attempts redondeado al entero más cercano
+        return (successful * 10000 * 2 + total_attempts) // (2 * total_attempts)
+    
+    def _calculate_success_rate(self) -> float:
+        """Calcular tasa de éxito en porcentaje con 2 decimales"""
+        return self._success_rate_bp() / 100
     
     def get_simple_status(self) -> Dict[str, Any]:
-        """Obtener estado simple del servicio"""
-        status = self.get_status()
+        """Obtener estado simple del servicio (sin construir get_status completo)"""
+        stats = self.stats
         return {
-            "enabled": status["service"]["enabled"],
-            "healthy": status["client"]["healthy"],
-            "messages_sent": status["service"]["individual_messages_sent"] + status["service"]["broadcast_messages_sent"],
-            "success_rate": status["service"]["success_rate"]
+            "enabled": self._enabled,
+            "healthy": self.health_check(),
+            "messages_sent": stats.individual_messages_sent + stats.broadcast_messages_sent,
+            "success_rate": self._calculate_success_rate()
         }
@@ -15,10 +15,11 @@ class AlertNormalizationError(ValueError):
 
 
 def _stringify(value: Any) -> str:
+    # Chequeo de tipo exacto primero: es el caso más común y evita el recorrido del MRO
+    if type(value) is str:
+        return value
     if value is None:
         return ""
-    if isinstance(value, str):
-        return value
     return str(value)
 
 
@@ -29,91 +30,62 @@ def _ensure_list(value: Any) -> List[Any]:
 
 
 def _normalize_string_list(values: Any) -> List[str]:
-    return [_stringify(item) for item in _ensure_list(values)]
+    if not isinstance(values, list):
+        return []
+    # Los elementos casi siempre ya son str: se devuelven sin llamar a _stringify
+    return [item if type(item) is str else _stringify(item) for item in values]
 
 
 def normalize_alert_to_tv(alert: Dict[str, Any]) -> Dict[str, Any]:
     """Normaliza una alerta del dominio al schema tv.v1."""
-    activacion_alerta = alert.get("activacion_alerta")
-    if not isinstance(activacion_alerta, dict) or not activacion_alerta.get("tipo_activacion"):
+    get = alert.get
+    activacion_alerta = get("activacion_alerta")
+    tipo_activacion = activacion_alerta.get("tipo_activacion") if isinstance(activacion_alerta, dict) else None
+    if not tipo_activacion:
         raise AlertNormalizationError("Falta alert.activacion_alerta.tipo_activacion")
+    tipo_activacion = _stringify(tipo_activacion)
 
-    base: Dict[str, Any] = {
-        "schema_version": "tv.v1",
-        "id": "",
-        "estado": "",
-        "nivel_alerta": "",
-        "prioridad": "",
-        "nombre": "",
-        "descripcion": "",
-        "imagen": "",
-        "ubicacion": {},
-        "instrucciones": [],
-        "elementos_necesarios": [],
-        "origen": {},
-        "contactos": [],
-        "dispositivos_notificados": [],
-        "timestamps": {},
-    }
-
-    base["id"] = _stringify(alert.get("_id") or alert.get("id"))
-    base["estado"] = "ACTIVA" if alert.get("activo") else "DESACTIVADA"
-    base["prioridad"] = _stringify(alert.get("prioridad"))
-    base["nombre"] = _stringify(alert.get("nombre_alerta") or alert.get("nombre"))
-    base["descripcion"] = _stringify(alert.get("descripcion"))
-    base["imagen"] = _stringify(alert.get("image_alert"))
-    base["instrucciones"] = _normalize_string_list(alert.get("instrucciones"))
-    base["elementos_necesarios"] = _normalize_string_list(alert.get("elementos_necesarios"))
-
-    data_payload: Dict[str, Any] = {}
-    if isinstance(alert.get("data"), dict):
-        data_payload = alert.get("data", {})
+    data_payload = get("data")
+    if not isinstance(data_payload, dict):
+        data_payload = {}
 
     nivel_alerta = data_payload.get("tipo_alarma")
     if nivel_alerta is None:
-        nivel_alerta = alert.get("tipo_alerta")
-    base["nivel_alerta"] = _stringify(nivel_alerta).upper() if nivel_alerta is not None else ""
+        nivel_alerta = get("tipo_alerta")
 
-    ubicacion = alert.get("ubicacion")
+    ubicacion = get("ubicacion")
     if isinstance(ubicacion, dict):
-        base["ubicacion"] = {
-            "nombre": _stringify(ubicacion.get("nombre")),
-            "direccion": _stringify(ubicacion.get("direccion")),
-            "maps": _stringify(
-                ubicacion.get("maps")
-                or ubicacion.get("url_maps")
-                or ubicacion.get("url_open_maps")
-            ),
-            "open_maps": _stringify(ubicacion.get("url_open_maps")),
+        ubicacion_get = ubicacion.get
+        open_maps = ubicacion_get("url_open_maps")
+        ubicacion_tv = {
+            "nombre": _stringify(ubicacion_get("nombre")),
+            "direccion": _stringify(ubicacion_get("direccion")),
+            "maps": _stringify(ubicacion_get("maps") or ubicacion_get("url_maps") or open_maps),
+            "open_maps": _stringify(open_maps),
         }
     elif isinstance(ubicacion, str):
-        base["ubicacion"] = {
+        ubicacion_tv = {
             "nombre": _stringify(ubicacion),
             "direccion": "",
             "maps": "",
             "open_maps": "",
         }
     else:
-        base["ubicacion"] = {
+        ubicacion_tv = {
             "nombre": "",
             "direccion": "",
             "maps": "",
             "open_maps": "",
         }
 
-    if _stringify(activacion_alerta.get("tipo_activacion")).lower() == "whatsapp":
-        if not base["ubicacion"]["nombre"]:
-            base["ubicacion"]["nombre"] = "whatsapp"
-        if not base["ubicacion"]["direccion"]:
-            base["ubicacion"]["direccion"] = "whatsapp"
-
-    base["origen"] = {
-        "tipo": _stringify(activacion_alerta.get("tipo_activacion")),
-        "nombre": _stringify(activacion_alerta.get("nombre")),
-    }
+    if tipo_activacion.lower() == "whatsapp":
+        if not ubicacion_tv["nombre"]:
+            ubicacion_tv["nombre"] = "whatsapp"
+        if not ubicacion_tv["direccion"]:
+            ubicacion_tv["direccion"] = "whatsapp"
 
     contactos: List[Dict[str, str]] = []
-    for contacto in _ensure_list(alert.get("numeros_telefonicos")):
+    for contacto in _ensure_list(get("numeros_telefonicos")):
         if not isinstance(contacto, dict):
             continue
         contactos.append(
@@ -123,20 +95,36 @@ def normalize_alert_to_tv(alert: Dict[str, Any]) -> Dict[str, Any]:
                 "telefono": _stringify(contacto.get("telefono") or contacto.get("numero")),
             }
         )
-    base["contactos"] = contactos
 
-    dispositivos = alert.get("topics_notificacion")
+    dispositivos = get("topics_notificacion")
     if dispositivos is None:
-        dispositivos = alert.get("topics_otros_hardware")
-    base["dispositivos_notificados"] = _normalize_string_list(dispositivos)
+        dispositivos = get("topics_otros_hardware")
 
-    base["timestamps"] = {
-        "creacion": _stringify(alert.get("fecha_creacion")),
-        "actualizacion": _stringify(alert.get("fecha_actualizacion")),
+    # Schema tv.v1: el dict de salida se construye una sola vez, en este orden de claves
+    return {
+        "schema_version": "tv.v1",
+        "id": _stringify(get("_id") or get("id")),
+        "estado": "ACTIVA" if get("activo") else "DESACTIVADA",
+        "nivel_alerta": _stringify(nivel_alerta).upper() if nivel_alerta is not None else "",
+        "prioridad": _stringify(get("prioridad")),
+        "nombre": _stringify(get("nombre_alerta") or get("nombre")),
+        "descripcion": _stringify(get("descripcion")),
+        "imagen": _stringify(get("image_alert")),
+        "ubicacion": ubicacion_tv,
+        "instrucciones": _normalize_string_list(get("instrucciones")),
+        "elementos_necesarios": _normalize_string_list(get("elementos_necesarios")),
+        "origen": {
+            "tipo": tipo_activacion,
+            "nombre": _stringify(activacion_alerta.get("nombre")),
+        },
+        "contactos": contactos,
+        "dispositivos_notificados": _normalize_string_list(dispositivos),
+        "timestamps": {
+            "creacion": _stringify(get("fecha_creacion")),
+            "actualizacion": _stringify(get("fecha_actualizacion")),
+        },
     }
 
-    return base
-
 
 def build_tv_topic(empresa: str, sede: str, pantalla: str) -> str:
     """Construye el topic MQTT para TV."""
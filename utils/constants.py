@@ -37,6 +37,16 @@ STATUS_DISCONNECTED = "disconnected"
 STATUS_ERROR = "error"
 STATUS_ALIVE = "alive"
 
+# Botones de WhatsApp
+WHATSAPP_BUTTON_ACTIVATE_USER = "Activar_User"
+# Botón "Estoy disponible" compartido por todos los handlers (solo lectura)
+WHATSAPP_AVAILABILITY_BUTTONS = [
+    {
+        "id": WHATSAPP_BUTTON_ACTIVATE_USER,
+        "title": "Estoy disponible"
+    }
+]
+
 # Intervalos de tiempo (segundos)
 STATS_INTERVAL = 60
 HEARTBEAT_INTERVAL = 30
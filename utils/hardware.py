@@ -0,0 +1,14 @@
+"""
+Utilidades para topics de hardware MQTT
+"""
+from typing import Optional
+
+HARDWARE_KINDS = ("SEMAFORO", "PANTALLA")
+
+
+def hardware_kind(topic: str) -> Optional[str]:
+    """Tipo de hardware de un topic, en el mismo orden que _select_data_hardware"""
+    for kind in HARDWARE_KINDS:
+        if kind in topic:
+            return kind
+    return None
@@ -1,9 +1,13 @@
 """
 Utilidades para configurar logging
 """
+import atexit
 import logging
+import logging.handlers
+import os
+import queue
 import sys
-from datetime import datetime
+import time
 
 ACTION_LOGGER_PREFIXES = (
     "clients.backend_client",
@@ -11,6 +15,14 @@ ACTION_LOGGER_PREFIXES = (
 )
 
 
+# Rotación de archivos de log (tamaño máximo por archivo y copias conservadas)
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+
+# Listeners activos por nombre de logger (se reemplazan si se reconfigura el logger)
+_listeners = {}
+
+
 class ActionFilter(logging.Filter):
     """Permitir solo logs de acciones y errores."""
 
@@ -26,6 +38,25 @@ class ActionFilter(logging.Filter):
         return False
 
 
+class CachedTimeFormatter(logging.Formatter):
+    """Formatter que reutiliza el timestamp ya formateado mientras no cambie el segundo."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (segundo, texto) en una sola tupla para que la lectura sea atómica entre hilos
+        self._asctime_cache = (None, "")
+
+    def formatTime(self, record: logging.LogRecord, datefmt: str = None) -> str:
+        second = int(record.created)
+        cached_second, asctime = self._asctime_cache
+        if second != cached_second:
+            asctime = time.strftime(datefmt or self.default_time_format, self.converter(second))
+            self._asctime_cache = (second, asctime)
+        if datefmt:
+            return asctime
+        return self.default_msec_format % (asctime, record.msecs)
+
+
 def setup_logger(name: str = "mqtt_app", level: str = "INFO",
                 log_file: str = None, format_string: str = None) -> logging.Logger:
     """
@@ -45,31 +76,59 @@ def setup_logger(name: str = "mqtt_app", level: str = "INFO",
     logger.setLevel(requested_level)
     logger.propagate = False
     
-    # Limpiar handlers existentes
+    # Limpiar handlers existentes (vaciando antes la cola del listener anterior)
+    previous_listener = _listeners.pop(name, None)
+    if previous_listener is not None:
+        previous_listener.stop()
     logger.handlers.clear()
     
     # Formato por defecto
     if format_string is None:
         format_string = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     
-    formatter = logging.Formatter(format_string)
+    formatter = CachedTimeFormatter(format_string)
     
     # Handler para consola (sin filtro — muestra todo)
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(requested_level)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    handlers = [console_handler]
 
     # Handler para archivo si se especifica (sin filtro)
     if log_file:
-        file_handler = logging.FileHandler(log_file)
+        # Crear el directorio del log en una sola llamada (no existe fuera de Docker)
+        log_dir = os.path.dirname(log_file)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file,
+            maxBytes=LOG_MAX_BYTES,
+            backupCount=LOG_BACKUP_COUNT,
+            encoding="utf-8"
+        )
         file_handler.setLevel(requested_level)
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
+    
+    # La escritura a consola/archivo se hace en un hilo aparte: el hilo que
+    # registra (callbacks MQTT, workers, event loop) solo encola el registro
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners[name] = listener
     
     return logger
 
 
+@atexit.register
+def _stop_listeners() -> None:
+    """Vaciar las colas de log pendientes al salir del proceso"""
+    for listener in list(_listeners.values()):
+        listener.stop()
+    _listeners.clear()
+
+
 def get_timestamped_filename(base_name: str, extension: str = "log") -> str:
     """
     Generar nombre de archivo con timestamp
@@ -81,5 +140,5 @@ def get_timestamped_filename(base_name: str, extension: str = "log") -> str:
     Returns:
         Nombre de archivo con timestamp
     """
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
     return f"{base_name}_{timestamp}.{extension}"
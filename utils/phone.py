@@ -0,0 +1,46 @@
+"""
+Normalización y validación de números de teléfono para WhatsApp
+"""
+from typing import Any
+
+
+def clean_phone_number(phone: Any) -> str:
+    """
+    Limpiar número de teléfono (remover +, espacios, guiones)
+    
+    Args:
+        phone: Número de teléfono en cualquier formato
+        
+    Returns:
+        Número limpio en formato internacional
+        
+    Raises:
+        ValueError: Si el número no es válido
+    """
+    # Remover caracteres no numéricos excepto +
+    cleaned = ''.join(char for char in str(phone) if char.isdigit() or char == '+')
+    
+    # Remover + del inicio si existe
+    if cleaned.startswith('+'):
+        cleaned = cleaned[1:]
+    
+    # Validar que sea un número válido
+    if not cleaned.isdigit():
+        raise ValueError(f"Número de teléfono inválido: {phone}")
+    
+    # Asegurar que tenga al menos 10 dígitos
+    if len(cleaned) < 10:
+        raise ValueError(f"Número de teléfono muy corto: {phone}")
+    
+    return cleaned
+
+
+def is_valid_phone(phone: Any) -> bool:
+    """Verificar si clean_phone_number acepta el número (sin lanzar excepción)"""
+    if not phone:
+        return False
+    try:
+        clean_phone_number(phone)
+        return True
+    except ValueError:
+        return False
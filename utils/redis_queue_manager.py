@@ -14,14 +14,165 @@ import os
 from dotenv import load_dotenv
 from config.settings import RedisConfig
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 load_dotenv()
 
+# Serialización de mensajes en el camino caliente (orjson si está instalado);
+# los mensajes solo contienen str/int/float, así que ambos son intercambiables
+if orjson is not None:
+    _dumps_message = orjson.dumps
+    _loads_message = orjson.loads
+else:
+    _dumps_message = json.dumps
+    _loads_message = json.loads
+
+# La cola pendiente es un ZSET con score = prioridad * PRIORITY_WEIGHT - timestamp en ms:
+# ZPOPMAX entrega primero la mayor prioridad y, dentro de ella, el mensaje más antiguo.
+# Los mensajes en proceso viven en un HASH (id -> JSON) más un ZSET (id -> timestamp
+# de inicio), así cada ack es O(1) y los mensajes huérfanos se pueden recuperar por edad.
+# Cada encolado deja además un token en una lista de aviso, sobre la que esperan
+# (BRPOP) los workers ociosos; los mensajes nunca salen del ZSET fuera de un claim.
+PRIORITY_WEIGHT = 10 ** 13
+
+
+def _queue_score(priority: int, timestamp: float) -> float:
+    """Score en la cola pendiente (ver PRIORITY_WEIGHT)"""
+    return priority * PRIORITY_WEIGHT - int(timestamp * 1000)
+
+
+# Encolar un mensaje y avisar a los workers; si se indica clave de deduplicación
+# solo se encola cuando la clave no existía (SET NX con TTL), todo en un round-trip.
+# KEYS: cola pendiente, avisos, [clave de deduplicación]
+# ARGV: JSON, score, máximo de avisos, TTL de deduplicación
+# Retorna 1 si se encoló, 0 si era duplicado
+LUA_ENQUEUE = """
+if #KEYS > 2 and not redis.call('SET', KEYS[3], 1, 'NX', 'EX', ARGV[4]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+redis.call('LPUSH', KEYS[2], 1)
+redis.call('LTRIM', KEYS[2], 0, tonumber(ARGV[3]) - 1)
+return 1
+"""
+
+# Reclamar hasta N mensajes: los saca de la cola y los registra en proceso, atómico.
+# Cada worker toma como mucho su parte de lo pendiente (pendientes / workers), así
+# una ráfaga se reparte entre los workers en vez de quedar detrás de uno solo.
+# KEYS: cola pendiente, hash de procesamiento, zset de procesamiento
+# ARGV: timestamp, máximo de mensajes, número de workers
+LUA_CLAIM = """
+local count = math.min(tonumber(ARGV[2]), math.ceil(redis.call('ZCARD', KEYS[1]) / tonumber(ARGV[3])))
+if count < 1 then
+    return {}
+end
+local popped = redis.call('ZPOPMAX', KEYS[1], count)
+local out = {}
+for i = 1, #popped, 2 do
+    local entry = popped[i]
+    local msg = cjson.decode(entry)
+    redis.call('HSET', KEYS[2], msg['id'], entry)
+    redis.call('ZADD', KEYS[3], ARGV[1], msg['id'])
+    out[#out + 1] = entry
+end
+return out
+"""
+
+# Ack atómico en el servidor: quita el mensaje de proceso y, según el resultado que
+# ya decidió el cliente, lo devuelve a la cola pendiente o lo mueve a fallidos.
+# El JSON actualizado llega listo desde Python: Redis no decodifica nada.
+# KEYS: hash de procesamiento, zset de procesamiento, cola pendiente, fallidos, avisos
+# ARGV: id, 'completed'|'requeue'|'failed', JSON actualizado, score, máximo de avisos
+# Retorna 1 si el mensaje estaba en proceso, 0 si no
+LUA_ACK = """
+if redis.call('HDEL', KEYS[1], ARGV[1]) == 0 then
+    return 0
+end
+redis.call('ZREM', KEYS[2], ARGV[1])
+if ARGV[2] == 'requeue' then
+    redis.call('ZADD', KEYS[3], ARGV[4], ARGV[3])
+    redis.call('LPUSH', KEYS[5], 1)
+    redis.call('LTRIM', KEYS[5], 0, tonumber(ARGV[5]) - 1)
+elseif ARGV[2] == 'failed' then
+    redis.call('LPUSH', KEYS[4], ARGV[3])
+end
+return 1
+"""
+
+# Devolver a la cola los mensajes en proceso más antiguos que un límite
+# (workers caídos). Vuelven con su score original, al frente de su prioridad.
+# KEYS: hash de procesamiento, zset de procesamiento, cola pendiente, avisos
+# ARGV: timestamp límite, máximo de avisos
+LUA_RECOVER = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+for _, id in ipairs(ids) do
+    local entry = redis.call('HGET', KEYS[1], id)
+    if entry then
+        local msg = cjson.decode(entry)
+        local score = (msg['priority'] or 0) * %(weight)d - math.floor((msg['timestamp'] or 0) * 1000)
+        redis.call('ZADD', KEYS[3], score, entry)
+        redis.call('HDEL', KEYS[1], id)
+    end
+    redis.call('ZREM', KEYS[2], id)
+end
+if #ids > 0 then
+    redis.call('LPUSH', KEYS[4], 1)
+    redis.call('LTRIM', KEYS[4], 0, tonumber(ARGV[2]) - 1)
+end
+return #ids
+""" % {"weight": PRIORITY_WEIGHT}
+
+# Migrar las listas del formato anterior (<cola> pendiente y <cola>:processing) a la
+# cola pendiente actual y borrarlas; después de la primera vez no hay nada que mover.
+# KEYS: lista pendiente anterior, lista de procesamiento anterior, cola pendiente, avisos
+# ARGV: máximo de avisos
+# Retorna el número de mensajes migrados
+LUA_MIGRATE_LEGACY = """
+local moved = 0
+for i = 1, 2 do
+    if redis.call('TYPE', KEYS[i])['ok'] == 'list' then
+        for _, entry in ipairs(redis.call('LRANGE', KEYS[i], 0, -1)) do
+            local msg = cjson.decode(entry)
+            local score = (msg['priority'] or 0) * %(weight)d - math.floor((msg['timestamp'] or 0) * 1000)
+            redis.call('ZADD', KEYS[3], score, entry)
+            moved = moved + 1
+        end
+        redis.call('DEL', KEYS[i])
+    end
+end
+if moved > 0 then
+    redis.call('LPUSH', KEYS[4], 1)
+    redis.call('LTRIM', KEYS[4], 0, tonumber(ARGV[1]) - 1)
+end
+return moved
+""" % {"weight": PRIORITY_WEIGHT}
+
+
 class RedisQueueManager:
     """
     Manejador de colas Redis para mensajes de WhatsApp
     Mantiene la secuencialidad FIFO pero permite múltiples workers
     """
     
+    # Intentos antes de mover un mensaje a la cola de fallidos
+    MAX_ATTEMPTS = 3
+    # Tope de tokens pendientes en la lista de aviso (solo despiertan workers)
+    MAX_WAKEUP_TOKENS = 100
+    # Ids reservados por cada INCRBY al contador compartido de la cola
+    ID_BLOCK_SIZE = 1_000_000
+    # Segundos entre PINGs de salud (conexiones ociosas del pool e is_healthy)
+    HEALTH_CHECK_INTERVAL = 30
+    # Mientras se considera caído, is_healthy reintenta el PING con este intervalo
+    UNHEALTHY_RECHECK_INTERVAL = 1
+    # Segundos que un mensaje puede estar en proceso (envío a la API con reintentos)
+    # antes de considerarlo huérfano de un consumidor caído
+    PROCESSING_BUDGET = 120
+    # Segundos entre barridos periódicos de mensajes huérfanos (los hace el worker 0)
+    RECOVERY_INTERVAL = 60
+    
     def __init__(self, config: RedisConfig = None):
         self.logger = logging.getLogger(__name__)
         
@@ -37,6 +188,8 @@ class RedisQueueManager:
             # Configuración de colas desde RedisConfig
             self.queue_name = config.whatsapp_queue_name
             self.workers_count = config.whatsapp_workers
+            self.batch_size = config.whatsapp_batch_size
+            self.block_timeout = config.whatsapp_block_timeout
             self.message_ttl = config.whatsapp_queue_ttl
         else:
             # Fallback a variables de entorno directo
@@ -48,16 +201,44 @@ class RedisQueueManager:
             
             self.queue_name = os.getenv('WHATSAPP_QUEUE_NAME', 'whatsapp_messages')
             self.workers_count = int(os.getenv('WHATSAPP_WORKERS', '3'))
+            self.batch_size = int(os.getenv('WHATSAPP_BATCH_SIZE', '1'))
+            self.block_timeout = int(os.getenv('WHATSAPP_BLOCK_TIMEOUT', '5'))
             self.message_ttl = int(os.getenv('WHATSAPP_QUEUE_TTL', '3600'))
         
         # Configuración de colas derivada
-        self.processing_queue = f"{self.queue_name}:processing"
+        self.pending_queue = f"{self.queue_name}:pending"
+        self.wakeup_queue = f"{self.queue_name}:wakeup"
+        self.processing_hash = f"{self.queue_name}:processing:hash"
+        self.processing_zset = f"{self.queue_name}:processing:zset"
         self.failed_queue = f"{self.queue_name}:failed"
+        self.sequence_key = f"{self.queue_name}:seq"
+        # Listas del formato anterior, solo para migrarlas al arrancar
+        # (ver migrate_legacy_queues)
+        self.legacy_queue = self.queue_name
+        self.legacy_processing_queue = f"{self.queue_name}:processing"
+        # Antigüedad a partir de la cual un mensaje en proceso se da por huérfano.
+        # Otros consumidores vivos comparten la cola: nunca se recupera con edad 0
+        self.stale_after = self.block_timeout + self.PROCESSING_BUDGET
         
         # Conexión Redis
         self.redis_client = None
         self.workers = []
+        self.executor = None
         self.is_running = False
+        self._stop_event = threading.Event()
+        
+        # Estado de salud en memoria (ver is_healthy)
+        self._healthy = True
+        self._health_checked_at = time.monotonic()
+        
+        # Bloque de ids únicos reservado en Redis (se renueva al agotarse)
+        self._id_next = 0
+        self._id_limit = 0
+        self._id_lock = threading.Lock()
+        
+        # Mensajes reclamados por este proceso, ya decodificados (id -> dict)
+        self._inflight: Dict[str, Dict] = {}
+        self._inflight_lock = threading.Lock()
         
         # Estadísticas
         self.stats = {
@@ -71,70 +252,127 @@ class RedisQueueManager:
     def _initialize_redis(self):
         """Inicializar conexión Redis"""
         try:
-            self.redis_client = redis.Redis(
+            # Sin decode_responses: las respuestas llegan como bytes y los mensajes
+            # se decodifican directo con orjson/json, sin pasar por str
+            connection_kwargs = dict(
                 host=self.redis_host,
                 port=self.redis_port,
                 db=self.redis_db,
                 password=self.redis_password,
-                decode_responses=True,
                 socket_connect_timeout=5,
-                socket_timeout=5,
+                # Holgura sobre la espera bloqueante para no cortar BRPOP por timeout de socket
+                socket_timeout=self.block_timeout + 5,
+                socket_keepalive=True,
+                health_check_interval=self.HEALTH_CHECK_INTERVAL,
                 retry_on_timeout=True
             )
             
+            # Pool acotado para comandos no bloqueantes (claims, acks, productores)
+            # y otro con una conexión por worker para las esperas bloqueantes, así
+            # un worker esperando nunca deja sin conexión a los acks
+            self.redis_client = redis.Redis(
+                connection_pool=redis.BlockingConnectionPool(
+                    max_connections=self.workers_count + 4, timeout=5, **connection_kwargs
+                )
+            )
+            self._blocking_client = redis.Redis(
+                connection_pool=redis.BlockingConnectionPool(
+                    max_connections=self.workers_count, timeout=5, **connection_kwargs
+                )
+            )
+            
             # Probar conexión
             self.redis_client.ping()
             self.logger.info(f"✅ Conectado a Redis: {self.redis_host}:{self.redis_port}")
             
+            # Scripts registrados una vez (EVALSHA, con recarga automática si faltan)
+            self._enqueue_script = self.redis_client.register_script(LUA_ENQUEUE)
+            self._claim_script = self.redis_client.register_script(LUA_CLAIM)
+            self._ack_script = self.redis_client.register_script(LUA_ACK)
+            self._recover_script = self.redis_client.register_script(LUA_RECOVER)
+            self._migrate_script = self.redis_client.register_script(LUA_MIGRATE_LEGACY)
+            
         except Exception as e:
             self.logger.error(f"❌ Error conectando a Redis: {e}")
             raise
     
     def is_healthy(self) -> bool:
-        """Verificar si Redis está disponible"""
-        try:
-            return self.redis_client.ping()
-        except Exception:
-            return False
+        """
+        Verificar si Redis está disponible sin un round-trip por llamada: el estado
+        se actualiza con el resultado de los comandos reales y con un PING cada
+        HEALTH_CHECK_INTERVAL segundos; si el último estado fue un fallo, el PING se
+        reintenta enseguida (como mucho cada UNHEALTHY_RECHECK_INTERVAL segundos)
+        """
+        interval = self.HEALTH_CHECK_INTERVAL if self._healthy else self.UNHEALTHY_RECHECK_INTERVAL
+        now = time.monotonic()
+        if now - self._health_checked_at >= interval:
+            self._health_checked_at = now
+            try:
+                self._healthy = bool(self.redis_client.ping())
+            except Exception:
+                self._healthy = False
+        return self._healthy
     
-    def add_message(self, message: str, priority: int = 0) -> bool:
+    def add_message(self, message: str, priority: int = 0, dedup_key: Optional[str] = None) -> bool:
         """
         Agregar mensaje a la cola Redis
         
         Args:
             message: Mensaje JSON string
             priority: Prioridad (0 = normal, 1 = alta)
+            dedup_key: Clave para descartar duplicados durante el TTL de la cola
             
         Returns:
-            bool: True si se agregó exitosamente
+            bool: True si se agregó exitosamente (o ya estaba encolado)
         """
         try:
             # Crear estructura del mensaje
+            now = time.time()
             message_data = {
-                'id': f"{int(time.time() * 1000)}_{threading.get_ident()}",
+                'id': self._next_message_id(),
                 'content': message,
                 'priority': priority,
-                'timestamp': time.time(),
+                'timestamp': now,
                 'attempts': 0
             }
             
-            # Usar LPUSH para FIFO (First In, First Out)
-            result = self.redis_client.lpush(
-                self.queue_name, 
-                json.dumps(message_data)
+            # Encolar por prioridad (FIFO dentro de cada prioridad) y avisar a los workers
+            keys = [self.pending_queue, self.wakeup_queue]
+            if dedup_key:
+                keys.append(f"{self.queue_name}:dedup:{dedup_key}")
+            added = self._enqueue_script(
+                keys=keys,
+                args=[
+                    _dumps_message(message_data), _queue_score(priority, now),
+                    self.MAX_WAKEUP_TOKENS, self.message_ttl,
+                ],
             )
             
-            if result:
+            self._healthy = True
+            if added:
                 self.logger.info(f"✅ Mensaje agregado a cola Redis: {message_data['id']}")
-                return True
             else:
-                self.logger.error(f"❌ Error agregando mensaje a cola Redis")
-                return False
+                self.logger.info(f"♻️ Mensaje duplicado ignorado: {dedup_key}")
+            return True
                 
         except Exception as e:
+            self._healthy = False
             self.logger.error(f"❌ Error agregando mensaje a Redis: {e}")
             return False
     
+    def _next_message_id(self) -> str:
+        """
+        Siguiente id único de mensaje. Los ids salen de bloques reservados con
+        INCRBY sobre un contador de la cola, así son únicos entre hilos y procesos
+        y solo cuesta un round-trip por bloque.
+        """
+        with self._id_lock:
+            if self._id_next >= self._id_limit:
+                self._id_limit = self.redis_client.incrby(self.sequence_key, self.ID_BLOCK_SIZE)
+                self._id_next = self._id_limit - self.ID_BLOCK_SIZE
+            self._id_next += 1
+            return str(self._id_next)
+    
     def get_message(self, timeout: int = 2) -> Optional[Dict]:
         """
         Obtener mensaje de la cola (bloqueo hasta timeout)
@@ -145,44 +383,79 @@ class RedisQueueManager:
         Returns:
             Dict con el mensaje o None si no hay mensajes
         """
+        messages = self.get_messages(1, timeout=timeout)
+        return messages[0] if messages else None
+    
+    def get_messages(self, max_count: int, timeout: int = 2) -> List[Dict]:
+        """
+        Obtener hasta max_count mensajes de la cola en un solo round-trip
+        (bloqueo hasta timeout solo si la cola está vacía)
+        
+        Args:
+            max_count: Máximo de mensajes a reclamar
+            timeout: Tiempo máximo de espera en segundos
+            
+        Returns:
+            Lista de mensajes (vacía si no hay mensajes)
+        """
         try:
-            # BRPOP para obtener de forma bloqueante (FIFO)
-            result = self.redis_client.brpop(self.queue_name, timeout=timeout)
+            batch = self._claim_messages(max_count)
             
-            if result:
-                queue_name, message_json = result
-                message_data = json.loads(message_json)
-                
-                # Mover a cola de procesamiento
-                self.redis_client.lpush(
-                    self.processing_queue,
-                    json.dumps(message_data)
-                )
-                
-                return message_data
-            else:
-                return None
+            # Cola vacía: esperar un aviso de nuevos mensajes y reintentar
+            if not batch and self._wait_for_message(timeout):
+                batch = self._claim_messages(max_count)
+            
+            self._healthy = True
+            messages = [_loads_message(message_json) for message_json in batch]
+            if messages:
+                with self._inflight_lock:
+                    for message_data in messages:
+                        self._inflight[message_data['id']] = message_data
+            return messages
                 
         except Exception as e:
             # Solo log si no es timeout
             if "Timeout" not in str(e):
+                self._healthy = False
                 self.logger.error(f"❌ Error obteniendo mensaje de Redis: {e}")
-            return None
+            return []
+    
+    def _claim_messages(self, max_count: int) -> List[str]:
+        """Sacar hasta max_count mensajes y registrarlos en proceso (un solo round-trip)"""
+        return self._claim_script(
+            keys=[self.pending_queue, self.processing_hash, self.processing_zset],
+            args=[time.time(), max_count, self.workers_count],
+        )
+    
+    def _wait_for_message(self, timeout: int) -> bool:
+        """
+        Bloquear hasta recibir un aviso de nuevos mensajes o vencer el timeout.
+        Solo se consume el token de aviso; el mensaje sigue en la cola hasta el claim.
+        """
+        return self._blocking_client.brpop(self.wakeup_queue, timeout=timeout) is not None
+    
+    def _ack_message(self, message_id: str, outcome: str, message_json="", score: float = 0) -> bool:
+        """Ejecutar el script de ack en Redis (un solo round-trip)"""
+        acked = bool(self._ack_script(
+            keys=[
+                self.processing_hash, self.processing_zset,
+                self.pending_queue, self.failed_queue, self.wakeup_queue,
+            ],
+            args=[message_id, outcome, message_json, score, self.MAX_WAKEUP_TOKENS],
+        ))
+        self._healthy = True
+        return acked
     
     def mark_message_completed(self, message_id: str) -> bool:
         """Marcar mensaje como completado"""
         try:
-            # Buscar y remover de la cola de procesamiento
-            processing_messages = self.redis_client.lrange(self.processing_queue, 0, -1)
-            
-            for msg_json in processing_messages:
-                msg_data = json.loads(msg_json)
-                if msg_data['id'] == message_id:
-                    # Remover de procesamiento
-                    self.redis_client.lrem(self.processing_queue, 1, msg_json)
-                    self.stats['processed_messages'] += 1
-                    self.logger.info(f"✅ Mensaje completado: {message_id}")
-                    return True
+            with self._inflight_lock:
+                self._inflight.pop(message_id, None)
+            
+            if self._ack_message(message_id, "completed"):
+                self.stats['processed_messages'] += 1
+                self.logger.info(f"✅ Mensaje completado: {message_id}")
+                return True
             
             self.logger.warning(f"⚠️ Mensaje no encontrado en procesamiento: {message_id}")
             return False
@@ -194,38 +467,94 @@ class RedisQueueManager:
     def mark_message_failed(self, message_id: str, error: str) -> bool:
         """Marcar mensaje como fallido"""
         try:
-            # Buscar en cola de procesamiento
-            processing_messages = self.redis_client.lrange(self.processing_queue, 0, -1)
-            
-            for msg_json in processing_messages:
-                msg_data = json.loads(msg_json)
-                if msg_data['id'] == message_id:
-                    # Incrementar intentos
-                    msg_data['attempts'] += 1
-                    msg_data['last_error'] = error
-                    msg_data['failed_at'] = time.time()
-                    
-                    # Remover de procesamiento
-                    self.redis_client.lrem(self.processing_queue, 1, msg_json)
-                    
-                    # Si no ha superado el límite, devolver a la cola
-                    if msg_data['attempts'] < 3:
-                        self.redis_client.lpush(self.queue_name, json.dumps(msg_data))
-                        self.logger.warning(f"🔄 Mensaje devuelto a cola (intento {msg_data['attempts']}): {message_id}")
-                    else:
-                        # Mover a cola de fallidos
-                        self.redis_client.lpush(self.failed_queue, json.dumps(msg_data))
-                        self.stats['error_count'] += 1
-                        self.logger.error(f"❌ Mensaje movido a fallidos: {message_id}")
-                    
-                    return True
+            # Usar el mensaje ya decodificado al reclamarlo; solo si este proceso
+            # no lo reclamó (p.ej. tras un reinicio) se lee desde Redis
+            with self._inflight_lock:
+                msg_data = self._inflight.pop(message_id, None)
+            if msg_data is None:
+                msg_json = self.redis_client.hget(self.processing_hash, message_id)
+                if msg_json is None:
+                    return False
+                msg_data = _loads_message(msg_json)
             
-            return False
+            # Incrementar intentos
+            msg_data['attempts'] = msg_data.get('attempts', 0) + 1
+            msg_data['last_error'] = error
+            msg_data['failed_at'] = time.time()
+            
+            # Si no ha superado el límite, devolver a la cola; si no, a fallidos
+            if msg_data['attempts'] < self.MAX_ATTEMPTS:
+                outcome = "requeue"
+                score = _queue_score(msg_data.get('priority', 0), msg_data['failed_at'])
+            else:
+                outcome = "failed"
+                score = 0
+            
+            if not self._ack_message(message_id, outcome, _dumps_message(msg_data), score):
+                return False
+            
+            if outcome == "requeue":
+                self.logger.warning(f"🔄 Mensaje devuelto a cola (intento {msg_data['attempts']}): {message_id}")
+            else:
+                self.stats['error_count'] += 1
+                self.logger.error(f"❌ Mensaje movido a fallidos: {message_id}")
+            
+            return True
             
         except Exception as e:
             self.logger.error(f"❌ Error marcando mensaje como fallido: {e}")
             return False
     
+    def recover_stale_messages(self, max_age: Optional[float] = None) -> int:
+        """
+        Devolver a la cola los mensajes en proceso más antiguos que max_age
+        
+        Args:
+            max_age: Antigüedad en segundos (por defecto el TTL de la cola)
+            
+        Returns:
+            int: Número de mensajes recuperados
+        """
+        if max_age is None:
+            max_age = self.message_ttl
+        try:
+            recovered = self._recover_script(
+                keys=[self.processing_hash, self.processing_zset, self.pending_queue, self.wakeup_queue],
+                args=[time.time() - max_age, self.MAX_WAKEUP_TOKENS],
+            )
+            if recovered:
+                self.logger.warning(f"♻️ {recovered} mensajes huérfanos devueltos a la cola")
+            return recovered
+            
+        except Exception as e:
+            self.logger.error(f"❌ Error recuperando mensajes en proceso: {e}")
+            return 0
+    
+    def migrate_legacy_queues(self) -> int:
+        """
+        Mover a la cola pendiente los mensajes que quedaron en las listas del
+        formato anterior (cola y :processing) y borrar esas listas
+        
+        Solo se ejecuta al arrancar los workers: el despliegue debe detener
+        primero todas las instancias con el formato anterior, porque la lista
+        :processing de un consumidor viejo todavía activo también se movería.
+        
+        Returns:
+            int: Número de mensajes migrados
+        """
+        try:
+            migrated = self._migrate_script(
+                keys=[self.legacy_queue, self.legacy_processing_queue, self.pending_queue, self.wakeup_queue],
+                args=[self.MAX_WAKEUP_TOKENS],
+            )
+            if migrated:
+                self.logger.warning(f"♻️ {migrated} mensajes migrados desde las listas anteriores")
+            return migrated
+            
+        except Exception as e:
+            self.logger.error(f"❌ Error migrando colas anteriores: {e}")
+            return 0
+    
     def start_workers(self, processor_function):
         """
         Iniciar workers para procesar mensajes
@@ -237,7 +566,14 @@ class RedisQueueManager:
             self.logger.warning("⚠️ Workers ya están corriendo")
             return
         
+        # Rescatar mensajes de una ejecución anterior. Otras instancias pueden
+        # estar procesando la misma cola, así que solo se recupera lo que superó
+        # stale_after; el resto lo rescata el barrido periódico del worker 0
+        self.migrate_legacy_queues()
+        self.recover_stale_messages(max_age=self.stale_after)
+        
         self.is_running = True
+        self._stop_event.clear()
         self.logger.info(f"🚀 Iniciando {self.workers_count} workers Redis...")
         
         # Crear workers usando ThreadPoolExecutor
@@ -252,75 +588,114 @@ class RedisQueueManager:
     def _worker_loop(self, worker_id: int, processor_function):
         """Loop principal del worker"""
         self.logger.info(f"🔄 Worker {worker_id} iniciado")
+        next_recovery = time.monotonic() + self.RECOVERY_INTERVAL
         
-        while self.is_running:
+        while not self._stop_event.is_set():
             try:
-                # Obtener mensaje de la cola
-                message_data = self.get_message(timeout=2)
+                # Barrido periódico de huérfanos de consumidores caídos (un solo worker)
+                if worker_id == 0 and time.monotonic() >= next_recovery:
+                    next_recovery = time.monotonic() + self.RECOVERY_INTERVAL
+                    self.recover_stale_messages(max_age=self.stale_after)
                 
-                if message_data:
-                    message_id = message_data['id']
-                    message_content = message_data['content']
-                    
-                    self.logger.info(f"📱 Worker {worker_id} procesando: {message_id}")
-                    
-                    try:
-                        # Procesar mensaje
-                        success = processor_function(message_content)
-                        
-                        if success:
-                            self.mark_message_completed(message_id)
-                        else:
-                            self.mark_message_failed(message_id, "Procesamiento fallido")
-                            
-                    except Exception as e:
-                        self.logger.error(f"❌ Worker {worker_id} error procesando: {e}")
-                        self.mark_message_failed(message_id, str(e))
+                # Obtener un lote de mensajes de la cola y procesarlo localmente
+                batch = self.get_messages(self.batch_size, timeout=self.block_timeout)
+                
+                for index, message_data in enumerate(batch):
+                    if index:
+                        # El reloj de recuperación cuenta desde que empieza su proceso
+                        self.redis_client.zadd(self.processing_zset, {message_data['id']: time.time()}, xx=True)
+                    self._process_message(worker_id, message_data, processor_function)
                 
             except Exception as e:
                 if self.is_running:  # Solo log si seguimos corriendo
                     self.logger.error(f"❌ Error en worker {worker_id}: {e}")
-                    time.sleep(1)  # Esperar antes de reintentar
+                    self._stop_event.wait(1)  # Esperar antes de reintentar
         
         self.logger.info(f"🛑 Worker {worker_id} detenido")
     
-    def stop_workers(self):
-        """Detener todos los workers"""
-        if not self.is_running:
-            self.logger.warning("⚠️ Workers no están corriendo")
-            return
+    def _process_message(self, worker_id: int, message_data: Dict, processor_function):
+        """Procesar un mensaje y marcar su resultado en Redis"""
+        message_id = message_data['id']
+        message_content = message_data['content']
         
-        self.logger.info("🛑 Deteniendo workers...")
-        self.is_running = False
+        self.logger.info(f"📱 Worker {worker_id} procesando: {message_id}")
         
-        # Esperar a que terminen
-        self.executor.shutdown(wait=True)
-        self.workers.clear()
+        try:
+            # Procesar mensaje
+            success = processor_function(message_content)
+            
+            if success:
+                self.mark_message_completed(message_id)
+            else:
+                self.mark_message_failed(message_id, "Procesamiento fallido")
+                
+        except Exception as e:
+            self.logger.error(f"❌ Worker {worker_id} error procesando: {e}")
+            self.mark_message_failed(message_id, str(e))
+    
+    def stop_workers(self, wait: bool = True):
+        """
+        Detener todos los workers
         
-        self.logger.info("✅ Workers detenidos")
+        Se puede llamar varias veces (incluso en paralelo desde otro hilo): con
+        wait=True siempre espera a que terminen, aunque otra llamada ya los haya
+        detenido sin esperar.
+        
+        Args:
+            wait: Esperar a que terminen (hasta block_timeout si están en BRPOP)
+        """
+        if self.executor is None:
+            return
+        
+        if self.is_running:
+            self.logger.info("🛑 Deteniendo workers...")
+            self.is_running = False
+        self._stop_event.set()
+        
+        # Esperar a que terminen (shutdown es idempotente y con wait=True une los hilos)
+        self.executor.shutdown(wait=wait)
+        if wait:
+            self.workers.clear()
+            self.logger.info("✅ Workers detenidos")
+    
+    def get_local_statistics(self) -> Dict[str, Any]:
+        """Estadísticas en memoria de este proceso (sin consultar Redis)"""
+        return {
+            'processed_messages': self.stats['processed_messages'],
+            'error_count': self.stats['error_count'],
+            'workers_count': self.workers_count,
+            'is_running': self.is_running,
+            'uptime_seconds': round(time.time() - self.stats['start_time'], 2),
+            'redis_healthy': self._healthy
+        }
+    
+    def get_queue_sizes(self) -> Dict[str, int]:
+        """Tamaños de las colas en Redis (un solo round-trip, sin MULTI/EXEC)"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zcard(self.pending_queue)
+        pipe.hlen(self.processing_hash)
+        pipe.llen(self.failed_queue)
+        queue_size, processing_size, failed_size = pipe.execute()
+        return {
+            'queue_size': queue_size,
+            'processing_size': processing_size,
+            'failed_size': failed_size
+        }
     
     def get_statistics(self) -> Dict[str, Any]:
-        """Obtener estadísticas de la cola"""
+        """
+        Obtener estadísticas de la cola (consulta Redis; para uso bajo demanda,
+        los reportes periódicos usan get_local_statistics)
+        """
         try:
-            queue_size = self.redis_client.llen(self.queue_name)
-            processing_size = self.redis_client.llen(self.processing_queue)
-            failed_size = self.redis_client.llen(self.failed_queue)
+            # Si Redis responde está sano, no hace falta un PING aparte
+            queue_sizes = self.get_queue_sizes()
+            self._healthy = True
             
-            uptime = time.time() - self.stats['start_time']
-            
-            return {
-                'queue_size': queue_size,
-                'processing_size': processing_size,
-                'failed_size': failed_size,
-                'processed_messages': self.stats['processed_messages'],
-                'error_count': self.stats['error_count'],
-                'workers_count': self.workers_count,
-                'is_running': self.is_running,
-                'uptime_seconds': round(uptime, 2),
-                'redis_healthy': self.is_healthy()
-            }
+            return {**queue_sizes, **self.get_local_statistics()}
             
         except Exception as e:
+            self._healthy = False
             self.logger.error(f"❌ Error obteniendo estadísticas: {e}")
             return {
                 'error': str(e),
@@ -338,16 +713,20 @@ class RedisQueueManager:
             int: Número de mensajes eliminados
         """
         try:
-            cleared_count = 0
+            targets = []
             
             if queue_type in ['main', 'all']:
-                cleared_count += self.redis_client.delete(self.queue_name)
+                targets += [self.pending_queue, self.wakeup_queue]
             
             if queue_type in ['processing', 'all']:
-                cleared_count += self.redis_client.delete(self.processing_queue)
+                targets += [self.processing_hash, self.processing_zset]
             
             if queue_type in ['failed', 'all']:
-                cleared_count += self.redis_client.delete(self.failed_queue)
+                targets.append(self.failed_queue)
+            
+            # Un solo UNLINK: un round-trip y la liberación de memoria ocurre en
+            # segundo plano en Redis, sin bloquear las esperas de los workers
+            cleared_count = self.redis_client.unlink(*targets) if targets else 0
             
             self.logger.info(f"🗑️ Cola {queue_type} limpiada: {cleared_count} mensajes")
             return cleared_count
@@ -0,0 +1,31 @@
+"""
+Serialización JSON compartida (usa orjson si está instalado)
+"""
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_text(data: Any, indent: bool = False) -> str:
+    """Serializar a texto JSON para logs (usa orjson si está instalado)"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        try:
+            return orjson.dumps(data, default=str, option=option).decode("utf-8")
+        except TypeError:
+            pass  # p.ej. enteros de más de 64 bits: usar json estándar
+    return json.dumps(data, ensure_ascii=False, default=str, indent=2 if indent else None)
+
+
+def dumps_payload(data: Any) -> str:
+    """Serializar payload MQTT compacto (usa orjson si está instalado)"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data).decode("utf-8")
+        except TypeError:
+            pass  # tipos que orjson no soporta: mismo error/resultado que json estándar
+    return json.dumps(data, separators=(',', ':'))
@@ -5,22 +5,59 @@ Recibe mensajes de WhatsApp por WebSocket y puede enviar notificaciones MQTT.
 """
 
 import asyncio
+import json
+import logging
+import random
 import signal
 import sys
 import os
-import logging
-import json
 from aiohttp import web
 
-# Agregar el directorio actual al path para las importaciones
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 from clients.websocket_server import WebSocketServer
 from clients.backend_client import BackendClient
 from services.whatsapp_service import WhatsAppService
-from handlers.websocket_message_handler import WebSocketMessageHandler
 from utils.logger import setup_logger
-from config import AppConfig
+from config import get_config
+
+# Tiempo máximo para todo el apagado ordenado antes de forzarlo
+# (por debajo de los 10 s de gracia de docker stop)
+SHUTDOWN_TIMEOUT = 8.0
+# Intervalo de estadísticas con jitter para no despertar a la vez varias instancias
+STATS_INTERVAL = 30
+STATS_JITTER = 5
+
+# Plantillas de estadísticas: logging las formatea con el dict de stats (%(clave)s)
+_STATS_TEMPLATE = (
+    "📊 Estadísticas WebSocket - WhatsApp:\n"
+    "  • Mensajes procesados: %(processed_messages)s\n"
+    "  • Errores: %(error_count)s\n"
+    "  • Cola actual: %(queue_size)s/%(queue_max_size)s\n"
+    "  • Procesando: %(processing_str)s\n"
+    "  • Tasa de error: %(error_rate)s%%\n"
+    + "=" * 50
+)
+_FINAL_STATS_TEMPLATE = (
+    "📊 Estadísticas finales WebSocket:\n"
+    "  • Total de mensajes procesados: %(processed_messages)s\n"
+    "  • Total de errores: %(error_count)s\n"
+    "  • Mensajes pendientes: %(queue_size)s\n"
+    "  • Tasa de éxito final: %(success_rate)s%%"
+)
+
+
+def _dumps(data) -> str:
+    """Serializar respuestas HTTP a JSON (usa orjson si está instalado)"""
+    if orjson is not None:
+        return orjson.dumps(data).decode("utf-8")
+    return json.dumps(data)
+
+
+_loads = orjson.loads if orjson is not None else json.loads
 
 
 class WebSocketService:
@@ -28,7 +65,7 @@ class WebSocketService:
     
     def __init__(self):
         # Configuración
-        self.config = AppConfig()
+        self.config = get_config()
         # Logger con archivo separado para poder hacer tail -f
         self.logger = setup_logger(
             "websocket_service", 
@@ -46,43 +83,53 @@ class WebSocketService:
             port=self.config.websocket.port,
             backend_client=self.backend_client,
             whatsapp_service=self.whatsapp_service,
-            enable_mqtt_publisher=True  # Habilitar envío MQTT desde WhatsApp
+            enable_mqtt_publisher=True,  # Habilitar envío MQTT desde WhatsApp
+            config=self.config
         )
         
         # Estado del servicio
         self.is_running = False
         self._http_runner = None
-
-        # Configurar manejo de señales
-        signal.signal(signal.SIGINT, self._signal_handler)
-        signal.signal(signal.SIGTERM, self._signal_handler)
+        # Evento que run() espera; las señales lo activan para detener el servicio
+        self._stop_event = None
+    
+    def _install_signal_handlers(self) -> None:
+        """Registrar SIGINT/SIGTERM en el event loop (se ejecutan en el hilo del loop)"""
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self._signal_handler)
+            except NotImplementedError:
+                # Windows: sin add_signal_handler, reenviar la señal al loop
+                signal.signal(sig, lambda signum, frame: loop.call_soon_threadsafe(self._signal_handler))
     
-    def _signal_handler(self, signum, frame):
+    def _signal_handler(self):
         """Manejar señales de terminación"""
         self.logger.info("\n¡Recibida señal de terminación para servicio WebSocket!")
-        asyncio.create_task(self.stop())
-        sys.exit(0)
+        # run() deja de esperar y ejecuta stop() en su finally
+        if self._stop_event is not None:
+            self._stop_event.set()
     
     async def _handle_fanout(self, request: web.Request) -> web.Response:
         """Endpoint HTTP interno: POST /internal/fanout-alert"""
         try:
-            alert_data = await request.json()
+            alert_data = await request.json(loads=_loads)
             if not isinstance(alert_data, dict):
-                return web.json_response({"success": False, "error": "alert_data must be a JSON object"}, status=400)
+                return web.json_response({"success": False, "error": "alert_data must be a JSON object"}, status=400, dumps=_dumps)
 
             handler = self.websocket_server.message_handler
             success = handler.trigger_fanout(alert_data)
-            return web.json_response({"success": success}, status=200 if success else 500)
+            return web.json_response({"success": success}, status=200 if success else 500, dumps=_dumps)
         except Exception as e:
             self.logger.error(f"❌ Error en /internal/fanout-alert: {e}")
-            return web.json_response({"success": False, "error": str(e)}, status=500)
+            return web.json_response({"success": False, "error": str(e)}, status=500, dumps=_dumps)
 
     async def _start_http_server(self) -> None:
         """Iniciar servidor HTTP interno en puerto 8081"""
         http_port = int(os.getenv("INTERNAL_HTTP_PORT", "8081"))
         app = web.Application()
         app.router.add_post("/internal/fanout-alert", self._handle_fanout)
-        app.router.add_get("/health", lambda r: web.json_response({"status": "ok"}))
+        app.router.add_get("/health", lambda r: web.json_response({"status": "ok"}, dumps=_dumps))
         self._http_runner = web.AppRunner(app)
         await self._http_runner.setup()
         site = web.TCPSite(self._http_runner, "0.0.0.0", http_port)
@@ -115,24 +162,21 @@ class WebSocketService:
     
     async def run(self):
         """Ejecutar el servicio WebSocket de forma continua"""
+        self._stop_event = asyncio.Event()
+        self._install_signal_handlers()
+        
         if not await self.start():
             self.logger.error("❌ No se pudo iniciar el servicio WebSocket")
             return False
         
         try:
-            # Iniciar tarea de estadísticas periódicas
-            stats_task = asyncio.create_task(self._show_statistics_periodically())
-            
-            try:
-                # Mantener el servidor corriendo indefinidamente
-                await asyncio.Future()
-            finally:
-                # Cancelar tarea de estadísticas
-                stats_task.cancel()
-                try:
-                    await stats_task
-                except asyncio.CancelledError:
-                    pass
+            # El TaskGroup espera a la tarea de estadísticas al salir y propaga sus errores
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(self._show_statistics_periodically())
+                
+                # Mantener el servidor corriendo hasta recibir una señal
+                # (la tarea de estadísticas también la espera y termina sola)
+                await self._stop_event.wait()
                     
         except KeyboardInterrupt:
             self.logger.info("Interrupción del usuario detectada")
@@ -147,56 +191,73 @@ class WebSocketService:
         self.is_running = False
         
         try:
-            # Detener procesamiento de cola WhatsApp
-            if hasattr(self, 'websocket_server') and self.websocket_server:
-                await self.websocket_server.stop_whatsapp_processing()
-                
-                # Mostrar estadísticas finales
-                await self._show_final_statistics()
-                
-                # Detener servidor
-                await self.websocket_server.stop()
-                self.logger.info("✅ WebSocket Server detenido")
-            
-            if self._http_runner:
-                await self._http_runner.cleanup()
-                self.logger.info("✅ HTTP interno detenido")
-
+            # Todo el apagado ordenado comparte un solo límite de tiempo
+            await asyncio.wait_for(self._shutdown(), timeout=SHUTDOWN_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.logger.warning("⚠️ El apagado superó %ss, forzando cierre", SHUTDOWN_TIMEOUT)
+            if self.websocket_server:
+                await self.websocket_server.force_stop()
         except Exception as e:
             self.logger.error(f"❌ Error deteniendo servicio: {e}")
+        finally:
+            if self.whatsapp_service:
+                self.whatsapp_service.close()
+    
+    async def _shutdown(self):
+        """Apagado ordenado: vaciar la cola, cerrar el servidor WebSocket y el HTTP interno"""
+        if self.websocket_server:
+            # Detener procesamiento de cola WhatsApp
+            await self.websocket_server.stop_whatsapp_processing()
+            
+            # Mostrar estadísticas finales
+            await self._show_final_statistics()
+            
+            # Detener servidor
+            await self.websocket_server.stop()
+            self.logger.info("✅ WebSocket Server detenido")
+        
+        if self._http_runner:
+            await self._http_runner.cleanup()
+            self.logger.info("✅ HTTP interno detenido")
+    
+    @staticmethod
+    def _enrich_stats(stats: dict) -> dict:
+        """Agregar a las estadísticas los campos derivados que usan las plantillas"""
+        stats['processing_str'] = 'Sí' if stats['is_processing'] else 'No'
+        stats['success_rate'] = 100 - stats['error_rate']
+        return stats
     
     async def _show_statistics_periodically(self):
         """Mostrar estadísticas del WebSocket periódicamente"""
         while self.is_running:
             try:
-                await asyncio.sleep(30)  # Mostrar estadísticas cada 30 segundos
-                
-                if self.websocket_server and self.websocket_server.is_running:
-                    stats = self.websocket_server.get_whatsapp_statistics()
+                # Espera interrumpible: la señal de parada termina el bucle al instante
+                await asyncio.wait_for(
+                    self._stop_event.wait(),
+                    timeout=STATS_INTERVAL + random.random() * STATS_JITTER
+                )
+                break
+            except asyncio.TimeoutError:
+                pass
+            
+            try:
+                # Sin INFO habilitado no se arma el snapshot de estadísticas
+                if (self.websocket_server and self.websocket_server.is_running
+                        and self.logger.isEnabledFor(logging.INFO)):
+                    stats = self._enrich_stats(self.websocket_server.get_whatsapp_statistics())
                     
-                    self.logger.info("📊 Estadísticas WebSocket - WhatsApp:")
-                    self.logger.info(f"  • Mensajes procesados: {stats['processed_messages']}")
-                    self.logger.info(f"  • Errores: {stats['error_count']}")
-                    self.logger.info(f"  • Cola actual: {stats['queue_size']}/{stats['queue_max_size']}")
-                    self.logger.info(f"  • Procesando: {'Sí' if stats['is_processing'] else 'No'}")
-                    self.logger.info(f"  • Tasa de error: {stats['error_rate']}%")
-                    self.logger.info("=" * 50)
+                    # Un solo registro: una escritura (y un flush) por handler en vez de siete
+                    self.logger.info(_STATS_TEMPLATE, stats)
                     
-            except asyncio.CancelledError:
-                break
             except Exception as e:
                 self.logger.warning(f"⚠️ Error mostrando estadísticas WebSocket: {e}")
     
     async def _show_final_statistics(self):
         """Mostrar estadísticas finales"""
-        if self.websocket_server:
-            stats = self.websocket_server.get_whatsapp_statistics()
+        if self.websocket_server and self.logger.isEnabledFor(logging.INFO):
+            stats = self._enrich_stats(self.websocket_server.get_whatsapp_statistics())
             
-            self.logger.info("📊 Estadísticas finales WebSocket:")
-            self.logger.info(f"  • Total de mensajes procesados: {stats['processed_messages']}")
-            self.logger.info(f"  • Total de errores: {stats['error_count']}")
-            self.logger.info(f"  • Mensajes pendientes: {stats['queue_size']}")
-            self.logger.info(f"  • Tasa de éxito final: {100 - stats['error_rate']}%")
+            self.logger.info(_FINAL_STATS_TEMPLATE, stats)
     
     def get_status(self) -> dict:
         """Obtener estado del servicio"""
@@ -214,6 +275,19 @@ class WebSocketService:
         }
 
 
+def _run(coro) -> None:
+    """Ejecutar el servicio con uvloop como event loop si está instalado (opcional)"""
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(coro)
+        return
+
+    # uvloop crea el loop directamente, sin tocar la política global
+    with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+        runner.run(coro)
+
+
 async def main():
     """Función principal para ejecutar el servicio WebSocket"""
     fallback_logger = None
@@ -245,4 +319,4 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    _run(main())